@@ -1,21 +1,58 @@
 import gradio as gr
 import pandas as pd
+import numpy as np
 from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+from bson import ObjectId
 import dateutil.parser
 import re
 import calendar
+import os
+import time
+import logging
+import threading
 from datetime import datetime
 from functools import lru_cache
+from collections import defaultdict
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; numpy fallbacks are used without it
+    njit = None
+
+try:
+    import ahocorasick
+except ImportError:  # pyahocorasick is optional; phrases are checked one by one without it
+    ahocorasick = None
+
+try:
+    import pyarrow
+except ImportError:  # pyarrow is optional; without it there is no Parquet cache either
+    pyarrow = None
+
+try:
+    from pyroaring import BitMap
+except ImportError:  # pyroaring is optional; trigram postings are plain sets without it
+    BitMap = None
+
+try:
+    import polars as pl
+except ImportError:  # polars is optional; the load-time rollups use pandas without it
+    pl = None
 
 # Debugging 
-DEBUG = True
-def debug_print(*args):
-    if DEBUG:
-        print("DEBUG:", *args)
+# Log arguments are formatted lazily, so the DEBUG messages cost nothing at the default INFO level
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+logger = logging.getLogger(__name__)
 
 # ---- Helper Functions ----
 def format_currency(amount):
     """Format currency with proper symbols and commas"""
+    # Fast path: prices from the DataFrame are already floats (np.float64 included)
+    if isinstance(amount, float):
+        if amount != amount:  # NaN
+            return "$0.00"
+        return f"${amount:,.2f}"
     try:
         if pd.isna(amount):
             return "$0.00"
@@ -44,57 +81,628 @@ def format_order_details(order):
     return "\n".join(details)
 
 # ---- MongoDB Connection ----
+# One pooled client per process. It connects lazily, so an unreachable server
+# shows up as a PyMongoError on the first query rather than here.
+_CLIENT = MongoClient("mongodb://localhost:27017/", serverSelectionTimeoutMS=5000, maxPoolSize=50)
+
 def get_db_connection():
-    try:
-        client = MongoClient("mongodb://localhost:27017/", serverSelectionTimeoutMS=5000)
-        client.server_info()
-        return client['orderData']['sample']
-    except Exception as e:
-        debug_print(f"MongoDB connection failed: {e}")
-        return None
+    return _CLIENT['orderData']['sample']
 
 # ---- Data Loading ----
 global_df = None
 
-@lru_cache(maxsize=1)
-def load_procurement_data():
-    global global_df
-    try:
-        collection = get_db_connection()
-        if collection is None:
-            return pd.DataFrame()
-        data = list(collection.find({}, {'_id': 0}))
-        df = pd.DataFrame(data)
-        if df.empty:
-            debug_print("Warning: Empty DataFrame")
-            return df
-        
-        # Data cleaning
-        df['Purchase Date'] = pd.to_datetime(df['Purchase Date'], format="%m/%d/%Y", errors='coerce')
-        valid_years = list(range(2012, 2016))
-        df = df[df['Purchase Date'].dt.year.isin(valid_years)]
-        
-        # Add derived columns
-        df['Year'] = df['Purchase Date'].dt.year
-        df['Month'] = df['Purchase Date'].dt.month
-        df['Quarter'] = df['Purchase Date'].dt.quarter
-        
-        # Clean numeric columns
-        df['Total Price'] = pd.to_numeric(df['Total Price'].astype(str).str.replace('$', '').str.replace(',', ''), errors='coerce')
-        df['Unit Price'] = pd.to_numeric(df['Unit Price'].astype(str).str.replace('$', '').str.replace(',', ''), errors='coerce')
-        
-        # Clean text columns
-        df['Supplier Name'] = df['Supplier Name'].astype(str).str.strip().str.lower()
+# Cleaned data is cached next to this file so a fresh process can skip the
+# full Mongo dump. After CACHE_MAX_AGE seconds only documents newer than the
+# stored _id watermark are fetched and appended. Bump CACHE_VERSION whenever
+# clean_procurement_data changes the columns it produces.
+CACHE_VERSION = 13
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "procurement_cache.parquet")
+CACHE_WATERMARK_PATH = CACHE_PATH + ".hwm"
+CACHE_MAX_AGE = 24 * 60 * 60
+
+# Fields read from Mongo: only the ones handlers use. _id is kept for the cache watermark.
+PROJECTION = {field: 1 for field in (
+    '_id', 'Requisition Number', 'Purchase Order Number', 'LPA Number', 'Purchase Date', 'Fiscal Year',
+    'Supplier Name', 'Supplier Code', 'Supplier Zip Code', 'Supplier Qualifications',
+    'Item Name', 'Item Description', 'Quantity', 'Unit Price', 'Total Price',
+    'Department Name', 'Location', 'CalCard',
+    'Acquisition Method', 'Acquisition Type', 'Sub-Acquisition Method',
+    'Classification Codes', 'Normalized UNSPSC',
+    'Segment Title', 'Family Title', 'Class Title', 'Commodity Title')}
+FETCH_BATCH_SIZE = 10000
+
+# Search columns are Arrow-backed strings so str.contains runs Arrow's
+# substring kernel over contiguous UTF-8 instead of per-object Python calls.
+SEARCH_DTYPE = 'string[pyarrow]' if pyarrow is not None else 'string'
+
+# Free-text columns searched row by row; each gets a lowercased "_<col>_lc" copy.
+# Categorical columns are searched through their categories instead.
+SEARCH_COLUMNS = ('Item Name', 'Item Description', 'LPA Number')
+# Low-cardinality text columns stored as pandas categoricals
+CATEGORY_COLUMNS = ('Supplier Name', 'Acquisition Method', 'Acquisition Type', 'Sub-Acquisition Method',
+                    'Department Name', 'Fiscal Year', 'CalCard', 'Supplier Qualifications',
+                    'Item Name', 'Location', 'Commodity Title', 'Class Title', 'Family Title', 'Segment Title')
+
+def clean_procurement_data(df):
+    if df.empty:
+        logger.warning("Empty DataFrame")
+        return df
+
+    # Data cleaning
+    df['Purchase Date'] = pd.to_datetime(df['Purchase Date'], format="%m/%d/%Y", errors='coerce')
+    valid_years = list(range(2012, 2016))
+    df = df[df['Purchase Date'].dt.year.isin(valid_years)]
+
+    # Add derived columns
+    df['Year'] = df['Purchase Date'].dt.year.astype('int16')
+    df['Month'] = df['Purchase Date'].dt.month.astype('int8')
+    df['Quarter'] = df['Purchase Date'].dt.quarter.astype('int8')
+    df['Day'] = df['Purchase Date'].dt.day.astype('int8')
+
+    # Clean numeric columns
+    df['Total Price'] = _parse_currency(df['Total Price'])
+    df['Unit Price'] = _parse_currency(df['Unit Price'])
+
+    # Clean text columns
+    df['Supplier Name'] = df['Supplier Name'].astype(str).str.strip().str.lower()
+    if 'Supplier Zip Code' in df.columns:
         df['Supplier Zip Code'] = df['Supplier Zip Code'].astype(str).str.strip()
+        # First five digits of the supplier ZIP ("95814-1234" -> 95814, missing -> -1) for exact matches
+        zip5 = df['Supplier Zip Code'].str.extract(r'(\d{5})', expand=False)
+        df['_zip5'] = pd.to_numeric(zip5, errors='coerce').fillna(-1).astype('int32')
+    if 'Supplier Qualifications' in df.columns:
         df['Supplier Qualifications'] = df['Supplier Qualifications'].astype(str).str.strip().str.upper()
-        
+
+    if 'CalCard' in df.columns:
         df['CalCard'] = df['CalCard'].astype(str).str.upper().str.strip()
-        
+
+    # "2013-2014" -> start 2013, end 2014, so fiscal year checks are integer compares
+    if 'Fiscal Year' in df.columns:
+        fiscal = df['Fiscal Year'].astype(str).str.extract(r'(\d{4})(?:\D+(\d{4}))?')
+        df['_fy_start'] = pd.to_numeric(fiscal[0], errors='coerce').astype('Int16')
+        df['_fy_end'] = pd.to_numeric(fiscal[1], errors='coerce').astype('Int16')
+
+    # Lowercased copies so handlers don't re-lower a whole column per question
+    for col in SEARCH_COLUMNS:
+        if col in df.columns:
+            df[f'_{col}_lc'] = df[col].astype(SEARCH_DTYPE).str.lower().fillna('')
+    # Item name and description (whichever exist) fused so item searches scan
+    # once; the \x1f separator keeps a query from matching across the two fields
+    item_search = None
+    for col in ('Item Name', 'Item Description'):
+        if col in df.columns:
+            lc = df[f'_{col}_lc']
+            item_search = lc if item_search is None else item_search + '\x1f' + lc
+    if item_search is not None:
+        df['_item_search'] = item_search
+
+    return _categorize(df)
+
+def _parse_currency(series):
+    """'$1,234.50' -> 1234.5 in one regex pass; columns that are already numeric pass through"""
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype('float64')
+    return pd.to_numeric(series.astype(str).str.replace(r'[$,]', '', regex=True), errors='coerce')
+
+def _observed_counts(series):
+    """value_counts without the zero rows a categorical reports for categories absent from series"""
+    counts = series.value_counts()
+    return counts[counts > 0]
+
+def _categorize(df):
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
+def _contains_mask(df, col, query):
+    """Case-insensitive literal substring match on a precomputed lowercase column"""
+    query = query.lower()
+    if not query:
+        return pd.Series(True, index=df.index)
+    if col in _category_lc:
+        return _category_mask(df, col, query)
+    return df[f'_{col}_lc'].str.contains(query, regex=False)
+
+def _category_mask(df, col, query):
+    # Match against the distinct values, then pick rows by category code
+    return pd.Series(np.isin(df[col].cat.codes.to_numpy(), _category_hits(col, query)), index=df.index)
+
+def _category_hits(col, query):
+    """Codes of the categories of col whose lowercased text contains query"""
+    if col in _trigram_idx and len(query) >= 3:
+        return _trigram_hits(col, query)
+    return np.flatnonzero(_category_lc[col].str.contains(query, regex=False))
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def _build_trigram_index(values):
+    """trigram -> codes of the (lowercased) values containing it"""
+    postings = defaultdict(set)
+    for code, value in enumerate(values):
+        for gram in _trigrams(value):
+            postings[gram].add(code)
+    if BitMap is not None:
+        return {gram: BitMap(codes) for gram, codes in postings.items()}
+    return dict(postings)
+
+def _trigram_hits(col, query):
+    # Categories sharing every trigram of the query are candidates; a
+    # substring check on those few strings confirms the match.
+    index = _trigram_idx[col]
+    values = _category_lc[col]
+    postings = [index.get(gram) for gram in _trigrams(query)]
+    if any(p is None for p in postings):
+        return []
+    candidates = postings[0].intersection(*postings[1:])
+    return [code for code in candidates if query in values[code]]
+
+def _fiscal_year_mask(df, year):
+    """Rows whose fiscal year starts or ends in year"""
+    year = int(year)
+    return ((df['_fy_start'] == year) | (df['_fy_end'] == year)).fillna(False).astype(bool)
+
+def _supplier_zip_mask(df, zip_code):
+    """Rows whose supplier ZIP is zip_code (always five digits from the question regexes)"""
+    return df['_zip5'] == int(zip_code)
+
+def _price_total(rows):
+    """Total Price summed over a boolean row mask or row positions, skipping NaN"""
+    return np.nansum(_TOTAL_PRICE[np.asarray(rows)])
+
+def _code_mask(df, col, code):
+    """Rows whose col text contains code; digit-only codes are answered from _code_idx"""
+    if not code.isdigit():
+        return df[col].astype(str).str.contains(code, regex=False, na=False)
+    mask = np.zeros(len(df), dtype=bool)
+    hits = [rows for run, rows in _code_idx.get(col, {}).items() if code in run]
+    if hits:
+        mask[np.concatenate(hits)] = True
+    return pd.Series(mask, index=df.index)
+
+def _item_mask(df, query):
+    """Rows whose item name or description contains query"""
+    return df['_item_search'].str.contains(query.lower(), regex=False)
+
+def _read_cache():
+    """Return (df, watermark, is_fresh) from the Parquet cache, or (None, None, False)"""
+    try:
+        df = pd.read_parquet(CACHE_PATH, engine="pyarrow", memory_map=True)
+        with open(CACHE_WATERMARK_PATH) as f:
+            version, watermark = f.read().split()
+        if int(version) != CACHE_VERSION:
+            raise ValueError(f"cache version {version} is stale")
+        watermark = ObjectId(watermark)
+    except Exception as e:
+        logger.debug("Cache not used: %s", e)
+        return None, None, False
+    is_fresh = time.time() - os.stat(CACHE_PATH).st_mtime < CACHE_MAX_AGE
+    return df, watermark, is_fresh
+
+def _write_cache(df, watermark):
+    try:
+        df.to_parquet(CACHE_PATH, engine="pyarrow", compression="zstd", index=False)
+        with open(CACHE_WATERMARK_PATH, "w") as f:
+            f.write(f"{CACHE_VERSION} {watermark}")
+    except Exception as e:
+        logger.warning("Cache write failed: %s", e)
+
+# Exact-key lookups rebuilt by _build_indices() whenever the data is loaded.
+# Keys are upper-cased strings, values are row positions for df.iloc.
+_req_idx = {}
+_po_idx = {}
+_code_rows = {}
+# "REQ\x1fPO" per row, upper-cased, for partial order-number matches
+_order_keys = pd.Series(dtype=SEARCH_DTYPE)
+# Lowercased categories of each categorical column, by category code
+_category_lc = {}
+# Trigram index over the categories of the big text columns: col -> {trigram: codes}
+TRIGRAM_COLUMNS = ('Supplier Name', 'Item Name', 'Location')
+_trigram_idx = {}
+# Row positions of every digit run in the code columns: col -> {'43211503': positions}.
+# A digit-only query is a substring of a row's text exactly when it is inside one of its runs.
+CODE_COLUMNS = ('Classification Codes', 'Normalized UNSPSC')
+_code_idx = {}
+# Distinct combinations of the classification title codes: col -> code per
+# combination, and the number of rows carrying each combination
+TITLE_COLUMNS = ('Commodity Title', 'Class Title', 'Family Title', 'Segment Title')
+_title_combo_codes = {}
+_title_combo_sizes = np.array([], dtype=np.int64)
+# Whole-dataset aggregates that don't depend on the question
+_TOP = {}
+# Purchase dates packed as YYYYMMDD int32 in ascending order, for binary-searched range counts
+_sorted_ymd = np.array([], dtype=np.int32)
+# Total Price as a plain float64 array, for summing over row masks and positions
+_TOTAL_PRICE = np.array([], dtype=np.float64)
+
+def _first_positions(keys):
+    keys = keys.reset_index(drop=True)
+    keys = keys[~keys.duplicated()]
+    return dict(zip(keys, keys.index))
+
+def _build_indices(df):
+    global _req_idx, _po_idx, _code_rows, _order_keys, _sorted_ymd, _TOP, _category_lc, _trigram_idx, _code_idx
+    global _TOTAL_PRICE, _title_combo_codes, _title_combo_sizes
+    _title_combo_codes, _title_combo_sizes = {}, np.array([], dtype=np.int64)
+    if df.empty:
+        _req_idx, _po_idx, _code_rows, _TOP, _category_lc, _trigram_idx, _code_idx = {}, {}, {}, {}, {}, {}, {}
+        _order_keys = pd.Series(dtype=SEARCH_DTYPE)
+        _sorted_ymd = np.array([], dtype=np.int32)
+        _TOTAL_PRICE = np.array([], dtype=np.float64)
+        return
+    _TOTAL_PRICE = df['Total Price'].to_numpy(dtype=np.float64, na_value=np.nan)
+    _req_idx, _po_idx, _code_rows = {}, {}, {}
+    _order_keys = pd.Series(dtype=SEARCH_DTYPE)
+    if 'Requisition Number' in df.columns:
+        req = df['Requisition Number'].astype(str).str.upper()
+        _req_idx = _first_positions(req)
+    if 'Purchase Order Number' in df.columns:
+        po = df['Purchase Order Number'].astype(str).str.upper()
+        _po_idx = _first_positions(po)
+    if 'Requisition Number' in df.columns and 'Purchase Order Number' in df.columns:
+        _order_keys = (req + '\x1f' + po).astype(SEARCH_DTYPE)
+    if 'Supplier Code' in df.columns:
+        _code_rows = df.groupby(df['Supplier Code'].astype(str).str.strip()).indices
+    _sorted_ymd = np.sort(_ymd(df['Year'].to_numpy(np.int32), df['Month'].to_numpy(np.int32),
+                              df['Day'].to_numpy(np.int32)))
+    _category_lc = {col: df[col].cat.categories.astype(str).str.lower()
+                    for col in CATEGORY_COLUMNS if col in df.columns}
+    _trigram_idx = {col: _build_trigram_index(_category_lc[col]) for col in TRIGRAM_COLUMNS if col in df.columns}
+    _code_idx = {col: _build_code_index(df[col]) for col in CODE_COLUMNS if col in df.columns}
+    title_cols = [col for col in TITLE_COLUMNS if col in df.columns]
+    if title_cols:
+        codes = np.column_stack([df[col].cat.codes.to_numpy() for col in title_cols])
+        combos, _title_combo_sizes = np.unique(codes, axis=0, return_counts=True)
+        _title_combo_codes = dict(zip(title_cols, combos.T))
+    _TOP = {
+        'supplier_counts': df['Supplier Name'].value_counts(),
+        'item_counts': df['Item Name'].value_counts(),
+        'supplier_spending': _category_sums(df, 'Supplier Name'),
+        **_calendar_rollups(df),
+    }
+    if 'Location' in df.columns:
+        _TOP['location_counts'] = df['Location'].value_counts()
+    if 'Class Title' in df.columns:
+        _TOP['class_counts'] = df['Class Title'].value_counts()
+    if 'Segment Title' in df.columns:
+        _TOP['segment_counts'] = df['Segment Title'].value_counts()
+
+def _ymd(year, month, day):
+    """Pack a date as the integer YYYYMMDD, which sorts like the date itself"""
+    return year * 10000 + month * 100 + day
+
+def _build_code_index(values):
+    """Map each digit run in values' text to the row positions it appears in"""
+    runs = values.astype(str).str.findall(r'\d+').reset_index(drop=True).explode().dropna()
+    positions = runs.index.to_numpy()
+    return {run: positions[idx] for run, idx in runs.groupby(runs.to_numpy()).indices.items()}
+
+def _daily_totals(df):
+    """Order count and spend per (Year, Month, Day, Quarter), in one pass over the rows"""
+    days = df[['Year', 'Month', 'Day', 'Quarter', 'Total Price']]
+    keys = ['Year', 'Month', 'Day', 'Quarter']
+    if pl is not None:
+        # Polars runs the full-size groupby on all cores
+        return (pl.from_pandas(days).lazy()
+                .group_by(keys)
+                .agg(pl.len().alias('count'), pl.col('Total Price').sum().alias('spend'))
+                .collect()
+                .to_pandas())
+    return (days.groupby(keys)
+            .agg(count=('Total Price', 'size'), spend=('Total Price', 'sum'))
+            .reset_index())
+
+def _calendar_rollups(df):
+    """Counts keyed by Year, (Year, Month) and (Year, Month, day); spend by Year, (Year, Quarter) and Quarter"""
+    daily = _daily_totals(df)
+    year_spend = daily.groupby('Year')['spend'].sum()
+    return {
+        'year_counts': daily.groupby('Year')['count'].sum(),
+        'year_spend': year_spend,
+        'year_avg_month': year_spend / 12,
+        'year_month_counts': daily.groupby(['Year', 'Month'])['count'].sum(),
+        'day_counts': daily.groupby(['Year', 'Month', 'Day'])['count'].sum(),
+        'year_quarter_spend': daily.groupby(['Year', 'Quarter'])['spend'].sum(),
+        'quarter_spend': daily.groupby('Quarter')['spend'].sum(),
+    }
+
+# Gradio answers several questions at once; the lock makes the first ones wait
+# for a single load instead of each building the indices
+_LOAD_LOCK = threading.Lock()
+
+def load_procurement_data():
+    with _LOAD_LOCK:
+        return _load_procurement_data()
+
+@lru_cache(maxsize=1)
+def _load_procurement_data():
+    df = _fetch_procurement_data()
+    _build_indices(df)
+    _select_intents(df.columns)
+    return df
+
+def _fetch_procurement_data():
+    global global_df, _mongo_available
+    _mongo_available = False
+    try:
+        cached, watermark, is_fresh = _read_cache()
+        if cached is not None and is_fresh:
+            return cached
+
+        collection = get_db_connection()
+        try:
+            # A reimport replaces every document, so nothing at or below the
+            # watermark means the cache no longer matches the collection.
+            if cached is not None and collection.count_documents({'_id': {'$lte': watermark}}, limit=1) == 0:
+                cached = None
+
+            query = {'_id': {'$gt': watermark}} if cached is not None else {}
+            data = list(collection.find(query, PROJECTION).sort('_id', 1).batch_size(FETCH_BATCH_SIZE))
+            _mongo_available = True
+        except PyMongoError as e:
+            logger.warning("MongoDB read failed: %s", e)
+            return cached if cached is not None else pd.DataFrame()
+        if not data:
+            if cached is not None:
+                os.utime(CACHE_PATH)
+                return cached
+            return clean_procurement_data(pd.DataFrame())
+
+        watermark = data[-1]['_id']
+        df = clean_procurement_data(pd.DataFrame(data).drop(columns='_id'))
+        if cached is not None:
+            # Categories differ between the two parts, so re-categorize after the concat
+            df = _categorize(pd.concat([cached, df], ignore_index=True))
+        _write_cache(df, watermark)
         return df
     except Exception as e:
-        debug_print(f"Data loading error: {e}")
+        logger.error("Data loading error: %s", e)
         return pd.DataFrame()
 
+# ---- Numeric Kernels ----
+# Both kernels return (sums, row counts) per group code, over the rows whose
+# year equals year (year < 0 keeps every row). NaN values count but add nothing.
+def _bincount_sum(codes, values, n_groups, years, year):
+    rows = codes >= 0
+    if year >= 0:
+        rows &= years == year
+    valid = rows & ~np.isnan(values)
+    return (np.bincount(codes[valid], weights=values[valid], minlength=n_groups),
+            np.bincount(codes[rows], minlength=n_groups))
+
+if njit is not None:
+    # Compiled on first use, so only the per-year fallbacks pay for it. No
+    # cache=True: the on-disk cache breaks when the module runs under another name
+    @njit
+    def _groupby_sum(codes, values, n_groups, years, year):
+        sums = np.zeros(n_groups, np.float64)
+        counts = np.zeros(n_groups, np.int64)
+        for i in range(codes.size):
+            c = codes[i]
+            if c < 0 or (year >= 0 and years[i] != year):
+                continue
+            counts[c] += 1
+            v = values[i]
+            if not np.isnan(v):
+                sums[c] += v
+        return sums, counts
+else:
+    _groupby_sum = _bincount_sum
+
+def _category_sums(df, col, value_col='Total Price', year=None):
+    """Sum value_col per category of a categorical column, like groupby(observed=True).sum(),
+    optionally over one year's rows only"""
+    cat = df[col].cat
+    codes = cat.codes.to_numpy().astype(np.int64)
+    values = df[value_col].to_numpy(dtype=np.float64, na_value=np.nan)
+    years = df['Year'].to_numpy()
+    n_groups = len(cat.categories)
+    # Without a year filter bincount is a single pass anyway, and using it here
+    # keeps the load-time supplier totals from compiling the kernel
+    kernel = _bincount_sum if year is None else _groupby_sum
+    totals, counts = kernel(codes, values, n_groups, years, -1 if year is None else year)
+    observed = counts > 0
+    return pd.Series(totals[observed], index=cat.categories[observed], name=value_col)
+
+def _top_n(sums, n):
+    """sums.nlargest(n) (ties keep first) using argpartition instead of a full sort"""
+    values = sums.to_numpy()
+    if n <= 0:
+        return sums.iloc[:0]
+    if n >= len(values):
+        return sums.nlargest(n)
+    kth = np.partition(values, len(values) - n)[len(values) - n]
+    above = np.flatnonzero(values > kth)
+    ties = np.flatnonzero(values == kth)[:n - len(above)]
+    idx = np.concatenate([above, ties])
+    idx = idx[np.lexsort((idx, -values[idx]))]
+    return sums.iloc[idx]
+
+# ---- Mongo Aggregations ----
+# Structured spend questions are grouped inside Mongo so only the totals come
+# back. Every helper returns None when the pipeline can't run and the handler
+# falls back to the DataFrame.
+
+# Only set when this load read from Mongo. A frame served from the cache, or a
+# failed read or aggregation, keeps questions off the server so they don't each
+# wait out the connection timeout.
+_mongo_available = False
+
+def _clean_price(field):
+    # Same cleaning as clean_procurement_data: drop "$" and "," then parse
+    stripped = {'$toString': f'${field}'}
+    for char in ('$', ','):
+        stripped = {'$replaceAll': {'input': stripped, 'find': {'$literal': char}, 'replacement': ''}}
+    price = {'$convert': {'input': stripped, 'to': 'double', 'onError': None, 'onNull': None}}
+    # A NaN price (a missing value stored as a double) would turn the whole $sum
+    # into NaN, where the DataFrame path skips it. NaN sorts below -inf in Mongo
+    # and fails every comparison in Python, so this range check nulls only NaN.
+    return {'$let': {'vars': {'p': price}, 'in': {'$cond': [
+        {'$and': [{'$gte': ['$$p', float('-inf')]}, {'$lte': ['$$p', float('inf')]}]}, '$$p', None]}}}
+
+_SPEND_FIELDS = {'$addFields': {
+    '_price': _clean_price('Total Price'),
+    '_year': {'$year': {'$dateFromString': {
+        'dateString': '$Purchase Date', 'format': '%m/%d/%Y', 'onError': None, 'onNull': None}}},
+}}
+
+def _spend_pipeline(match=None, year=None):
+    """Match raw documents, add cleaned price/year and keep the same years as the DataFrame"""
+    pipeline = [{'$match': match}] if match else []
+    pipeline.append(_SPEND_FIELDS)
+    years = {'$gte': 2012, '$lte': 2015}
+    if year:
+        years['$eq'] = year
+    pipeline.append({'$match': {'_year': years}})
+    return pipeline
+
+def _aggregate(pipeline):
+    global _mongo_available
+    if not _mongo_available:
+        return None
+    try:
+        return list(get_db_connection().aggregate(pipeline))
+    except Exception as e:
+        logger.warning("Aggregation failed: %s", e)
+        _mongo_available = False
+        return None
+
+def _top_suppliers(year, n):
+    # Mongo rejects {'$limit': 0}, and a failed aggregation turns pushdown off
+    if n <= 0:
+        return pd.Series(dtype='float64')
+    rows = _aggregate(_spend_pipeline(year=year) + [
+        {'$group': {'_id': {'$toLower': {'$trim': {'input': '$Supplier Name'}}}, 'total': {'$sum': '$_price'}}},
+        {'$sort': {'total': -1}},
+        {'$limit': n},
+    ])
+    if rows is None:
+        return None
+    return pd.Series({row['_id']: row['total'] for row in rows}, dtype='float64')
+
+def _top_acquisition_type(year):
+    rows = _aggregate(_spend_pipeline(year=year) + [
+        {'$group': {'_id': '$Acquisition Type', 'total': {'$sum': '$_price'}}},
+        # Documents without a type form a null group the DataFrame path never has
+        {'$match': {'_id': {'$ne': None}}},
+        {'$sort': {'total': -1}},
+        {'$limit': 1},
+    ])
+    if rows is None:
+        return None
+    return pd.Series({row['_id']: row['total'] for row in rows}, dtype='float64')
+
+def _fiscal_year_spend(match, year):
+    """Return (total, count) for documents matching `match` in fiscal year `year`"""
+    match = dict(match, **{'Fiscal Year': {'$regex': re.escape(str(year))}})
+    rows = _aggregate(_spend_pipeline(match) + [
+        {'$group': {'_id': None, 'total': {'$sum': '$_price'}, 'count': {'$sum': 1}}},
+    ])
+    if rows is None:
+        return None
+    if not rows:
+        return 0.0, 0
+    return rows[0]['total'], rows[0]['count']
+
+# ---- Question Patterns ----
+# Compiled once at import so each chat turn skips the re module's pattern cache lookup.
+_ZIP_RE = re.compile(r"(?:zip code|zip|location)\s*(\d{5})")
+_ACQ_METHOD_RE = re.compile(r"the (.+?) acquisition method")
+_IN_YEAR_RE = re.compile(r"in (\d{4})")
+_TOP_N_RE = re.compile(r"top (\d+)")
+_SUPPLIER_CODE_RE = re.compile(r"supplier code (\d+)")
+_FISCAL_YEAR_RE = re.compile(r"fiscal year (\d{4})")
+_UNSPSC_ITEM_RE = re.compile(r"for (.+?)\??$")
+_SUB_METHOD_RE = re.compile(r"method (.+?)\??$")
+_CLASSIFICATION_ITEM_RE = re.compile(r"the (.+?)\??$")
+_ITEM_CODE_YEAR_RE = re.compile(r"items of (\w+) (?:bought|purchased) in (\d{4})")
+_DEPARTMENT_FY_RE = re.compile(r"department (.+?) in fiscal year (\d{4})")
+_LOCATION_RE = re.compile(r"location (\d+)")
+_PO_ITEM_RE = re.compile(r"item (.+?) in")
+_PO_NUMBER_RE = re.compile(r"purchase order (.+?)$")
+_SUPPLIER_FY_SPEND_RE = re.compile(r"total spend by (.+?) in (?:the )?fiscal year (\d{4})")
+_LPA_RE = re.compile(r"how many items? (?:were|was) purchased from (.+?) using lpa number ([A-Za-z0-9\-]+)")
+_ANY_YEAR_RE = re.compile(r"(\d{4})")
+_REQ_PO_RE = re.compile(r"purchase order number (?:for|of) (?:the )?requisition (\w+)")
+_SUPPLIER_YEARS_RE = re.compile(r"total orders from (.+?) (?:in|during) (.+)")
+_QUANTITY_OF_RE = re.compile(r"(?:total|how many) quantity of (.+?) (?:purchased|bought|ordered) (?:in|during) (\d{4})")
+_QUANTITY_WERE_RE = re.compile(r"(?:total|how many) (.+?) (?:were|was) (?:purchased|bought|ordered) (?:in|during) (\d{4})")
+_ITEMS_ORDERED_RE = re.compile(r"how many items? (?:were|was) ordered? in (\d{4})")
+_ITEM_COUNT_YEAR_RE = re.compile(r"how many (.+?) (?:were|was) (?:purchased|bought|ordered) (?:in|during) (\d{4})")
+_SUPPLIER_ORDERS_YEAR_RE = re.compile(r"(?:total|how many) orders? (?:from|of|for) (.+?) (?:in|during) (\d{4})")
+_ITEM_SPEND_YEAR_RE = re.compile(r"total (?:price|spend|spending|amount) (?:of|for) ([\w\s\-]+) (?:purchased|bought)? (?:in|for|during) (\d{4})")
+_CALCARD_YEAR_RE = re.compile(r"(?:total|how much) (?:calcard|cal card) (?:spend|spending|amount) (?:in|for|during) (\d{4})")
+_CALCARD_WHAT_RE = re.compile(r"(?:what was|what's) (?:the)? (?:calcard|cal card) (?:spend|spending|amount) (?:in|for|during) (\d{4})")
+_DATE_RANGE_RE = re.compile(r"orders? between (\w+)\s+(\d{4}) and (\w+)\s+(\d{4})")
+_SUPPLIERS_ZIP_RE = re.compile(r"(?:list|show|all) suppliers? (?:from|in|with) zip(?: code)?\s*(\d{5})")
+_SUPPLIERS_QUAL_RE = re.compile(r"suppliers? with ([\w\-]+) qualification")
+_ITEM_TOTAL_YEAR_RE = re.compile(r"total (?:price|spend|spending|amount) (?:of|for) ([\w\s\-]+) (?:in|for|during) (\d{4})")
+_SPEND_ON_YEAR_RE = re.compile(r"how much (?:was|did) (?:we|they) spend on ([\w\s\-]+) (?:in|for|during) (\d{4})")
+_LIST_SUPPLIERS_RE = re.compile(r"(?:list|show|name|all|give me) (?:the|of|all)? ?suppliers?")
+_TOTAL_ORDERS_RE = re.compile(r"total orders? (?:of|from|by|for) ([\w\s\-]+)")
+_TOTAL_ORDERS_YEAR_RE = re.compile(r"total orders? (?:of|from|by|for) ([\w\s\-]+) (?:in|for|during) (\d{4})")
+_SPECIFIC_DATE_RE = re.compile(r"(?:on|made on|placed on|received on)? ?(\w+)\s+(\d{1,2}),?\s+(\d{4})")
+_MONTH_YEAR_RE = re.compile(r"(?:in|for|from) (\w+) (\d{4})")
+_ORDERS_YEAR_RE = re.compile(r"(?:how many|number of)? ?orders (?:were )?(?:placed|made|received)? ?(?:in|during|for)? ?(\d{4})")
+_QUARTER_YEAR_RE = re.compile(r"quarter.*highest.*(?:in|for)? ?(\d{4})")
+_SUPPLIER_ZIP_ORDERS_RE = re.compile(r"orders? from suppliers? in zip (\d{5})")
+_DELIVERED_ZIP_RE = re.compile(r"orders? delivered to (\d{5})")
+_CLASSIFICATION_CODE_RE = re.compile(r"classification code (\d+)")
+_CATEGORY_RE = re.compile(r"(orders|purchases) (under|in|from|for) (.+?) (category|item|group)?\??$")
+_SUPPLIER_MADE_RE = re.compile(r"how many orders did ([\w\s&\-\.]+) (make|place|have|do)\??")
+_SPEND_BY_RE = re.compile(r"total (spend|spending|expenditure|amount) by ([\w\s&\-\.]+)")
+_ORDERS_USING_RE = re.compile(r"orders (?:using|used|with) ([\w\s\/\-]+)")
+_TOTAL_SPENDING_YEAR_RE = re.compile(r"(?:total|overall) spending in (\d{4})")
+_AVG_MONTHLY_RE = re.compile(r"average monthly spending(?: in| of)? ([\d,\sand]+)")
+_SPENDING_ON_RE = re.compile(r"total spending on ([\w\s&\-\.]+)")
+# Any "most orders" phrasing; the handler also requires "supplier" in the question
+_MOST_ORDERS_RE = re.compile(r"most orders|(?:highest|largest|greatest|maximum|biggest|top) number of orders"
+                             r"|(?:supplier with|which supplier had) (?:the )?(?:most|max) number of orders")
+_ITEMS_MOST_RE = re.compile(r"(what|which) (items|item) (were|was)? ?(bought|purchased|ordered)? ?(the )?most")
+_HOW_MUCH_SPEND_RE = re.compile(r"how much (did we|was)? ?(spend|spent) on ([\w\s&\-\.]+)")
+_SEGMENT_RE = re.compile(r"orders in (the )?([\w\s&\-\.]+) segment")
+_SUPPLIER_ORDERS_IN_YEAR_RE = re.compile(r"orders? (?:from|by|with|placed with|made by) ([\w\s&\-\.]+) in (\d{4})")
+_HOW_MANY_ORDERS_FROM_RE = re.compile(r"how many orders (from|by|with|placed with|made by) ([\w\s&\-\.]+)\??")
+_TOP_ITEMS_RE = re.compile(r"(top|show|list|give me|tell me|what are|which are)? ?(\d+)? ?(most|top)? ?(bought|purchased|ordered)? ?items")
+_YEARS_RE = re.compile(r"\b(20\d{2})\b")
+_ORDER_NUMBER_RE = re.compile(r"(?:requisition|req|purchase order|po)[\s\-]?(?:number|no|#)?[\s\-]*([a-z0-9\-\.]+)", re.IGNORECASE)
+_ACQ_WORDS_RE = re.compile(r"(method|type|acquisition)")
+_POSSESSIVE_RE = re.compile(r"'s$")
+_PLURAL_RE = re.compile(r"s$")
+
+# Trigger phrases for branches that used to be plain substring checks
+_ZIP_PURCHASES_RE = re.compile(r"purchases delivered to zip|purchases in zip|orders delivered to")
+_PURCHASES_USED_RE = re.compile(r"purchases used the")
+_TOTAL_SPEND_RE = re.compile(r"total spend")
+_TOTAL_PRICE_OR_SPEND_RE = re.compile(r"total price|total spend")
+_HIGHEST_SPEND_TYPE_RE = re.compile(r"acquisition type had the highest spend")
+_MOST_FREQUENT_ITEMS_RE = re.compile(r"most frequently purchased items")
+_NORMALIZED_UNSPSC_RE = re.compile(r"normalized unspsc for")
+_SUB_METHOD_TRANSACTIONS_RE = re.compile(r"transactions with sub-acquisition method")
+_SEGMENT_FAMILY_RE = re.compile(r"segment and family classification")
+_TOP_THREE_SUPPLIERS_RE = re.compile(r"top three suppliers based on total spend")
+_DEPARTMENT_SPEND_RE = re.compile(r"total spend for the department")
+_LINKED_LOCATION_RE = re.compile(r"purchases linked to location")
+_SUPPLIER_CODE_TOTAL_RE = re.compile(r"total price for all purchases under supplier code")
+_ITEMS_BY_TYPE_RE = re.compile(r"list all items purchased under the acquisition type")
+_QUALIFIED_PURCHASES_RE = re.compile(r"purchases from suppliers with the qualification")
+_PO_QUANTITY_RE = re.compile(r"quantity and unit price for the item")
+_METHOD_COUNT_RE = re.compile(r"how many purchases were made using the acquisition method")
+_SEGMENT_FAMILY_DOES_RE = re.compile(r"segment and family classification does the")
+_ACQ_METHODS_RE = re.compile(r"acquisition methods")
+_MOST_EXPENSIVE_RE = re.compile(r"most expensive")
+_COMMON_LOCATION_RE = re.compile(r"most common delivery location|location with most orders")
+_ORDER_WORD_RE = re.compile(r"order")
+_QUARTER_WITH_RE = re.compile(r"quarter with")
+_MOST_FREQUENT_RE = re.compile(r"most frequent")
+_ORDERS_RANKING_RE = re.compile(r"most orders|number of orders")
+_SPENDING_BY_SUPPLIER_RE = re.compile(r"spending by supplier")
+_COMMON_CLASS_RE = re.compile(r"most common class")
+_TOP_SEGMENTS_RE = re.compile(r"top categories|top segments")
+_LOCATION_MOST_ORDERS_RE = re.compile(r"location with most orders")
+_SUPPLIER_SPENDING_RANK_RE = re.compile(r"most expensive|highest spending|most spending|greatest spending|largest spending")
+
 # ---- Question Logic ----
 def month_str_to_number(month_name):
     try:
@@ -104,882 +712,1062 @@ def month_str_to_number(month_name):
             return pd.to_datetime(month_name, format='%B').month
         except:
             return None
-        
-
-def handle_question(question):
-    df = load_procurement_data()
-    if df.empty:
-        return "⚠️ Could not load data. Please check database connection."
-
-    question = question.lower()
 
-    # ===== NEW QUESTION HANDLERS =====
- 
-    if any(phrase in question for phrase in ["purchases delivered to zip", "purchases in zip", "orders delivered to"]):
-        zip_match = re.search(r"(?:zip code|zip|location)\s*(\d{5})", question)
-        if zip_match:
-            zip_code = zip_match.group(1)
-            # Search in both Location and Supplier Zip Code columns
-            location_mask = df['Location'].astype(str).str.contains(zip_code)
-            supplier_zip_mask = df['Supplier Zip Code'].astype(str).str.contains(zip_code)
-            purchases = df[location_mask | supplier_zip_mask]
-
-            if not purchases.empty:
-                return "📍 Purchases for location {}:\n{}".format(
-                    zip_code,
-                    "\n".join([
-                        f"- {row['Item Name']} (${row['Total Price']:,.2f}, {row['Purchase Date'].strftime('%Y-%m-%d')})"
-                        for _, row in purchases.head(20).iterrows()
-                    ])
-                )  # Properly closed parentheses
-            else:
-                return f"⚠️ No purchases found for ZIP code {zip_code}"
-
-    # ===== PURCHASES BY ACQUISITION METHOD =====
-    elif "purchases used the" in question and "acquisition method" in question:
-        method_match = re.search(r"the (.+?) acquisition method", question)
-        if method_match:
-            method = method_match.group(1).strip()
-            year_match = re.search(r"in (\d{4})", question)
-
-            if year_match:
-                year = int(year_match.group(1))
-                method_mask = df['Acquisition Method'].str.contains(method, case=False)
-                year_mask = df['Year'] == year
-                count = df[method_mask & year_mask].shape[0]
-                return f"📦 Number of {method} purchases in {year}: {count}"
-            else:
-                count = df[df['Acquisition Method'].str.contains(method, case=False)].shape[0]
-                return f"📦 Total {method} purchases: {count}"
-    
-    # ===== TOP N SUPPLIERS BY SPEND =====
-    if "top" in question and "suppliers" in question and "total spend" in question:
-        # Extract the number (default to 3 if not specified)
-        num_match = re.search(r"top (\d+)", question)
-        n = int(num_match.group(1)) if num_match else 3
-
-        # Check if year is specified
-        year_match = re.search(r"in (\d{4})", question)
-        if year_match:
-            year = int(year_match.group(1))
-            suppliers = df[df['Year'] == year].groupby('Supplier Name')['Total Price']\
-                        .sum().nlargest(n)
-            time_period = f"in {year}"
-        else:
-            suppliers = df.groupby('Supplier Name')['Total Price']\
-                        .sum().nlargest(n)
-            time_period = "overall"
-
-        if not suppliers.empty:
-            return "🏆 Top {} suppliers {}:\n{}".format(
-                n,
-                time_period,
-                "\n".join([f"{i+1}. {supplier}: ${amt:,.2f}" 
-                        for i, (supplier, amt) in enumerate(suppliers.items())])
-            )  # Properly closed parentheses
-        else:
-            return f"⚠️ No supplier data found {time_period}"
-
-    # ===== SUPPLIER CODE SPENDING =====
-    elif "supplier code" in question and ("total price" in question or "total spend" in question):
-        code_match = re.search(r"supplier code (\d+)", question)
-        if code_match:
-            code = code_match.group(1).strip()
-            # Convert both to strings for comparison
-            supplier_data = df[df['Supplier Code'].astype(str).str.strip() == code]
-
-            if not supplier_data.empty:
-                total = supplier_data['Total Price'].sum()
-                supplier_name = supplier_data.iloc[0]['Supplier Name']
-                return (f"🏢 Total spend for supplier code {code} ({supplier_name}): "
-                        f"${total:,.2f}\n"
-                        f"- Number of purchases: {len(supplier_data)}")
-            else:
-                return f"⚠️ No purchases found for supplier code {code}"
-
-    # ===== HIGHEST SPEND ACQUISITION TYPE =====
-    elif "acquisition type had the highest spend" in question:
-        year_match = re.search(r"in (\d{4})", question)
-        if year_match:
-            year = int(year_match.group(1))
-            df_year = df[df['Year'] == year]
-        else:
-            df_year = df
 
-        if not df_year.empty:
-            top_type = df_year.groupby('Acquisition Type')['Total Price'].sum().nlargest(1)
-            return (f"📊 Highest spending acquisition type "
-                    f"{'in '+str(year) if year_match else ''}:\n"
-                    f"- {top_type.index[0]}: ${top_type.iloc[0]:,.2f}")
-        else:
-            return f"⚠️ No data found for specified year"
-
-    # ===== FREQUENTLY PURCHASED ITEMS =====
-    elif "most frequently purchased items" in question and "fiscal year" in question:
-        year_match = re.search(r"fiscal year (\d{4})", question)
-        if year_match:
-            year = year_match.group(1)
-            fiscal_mask = df['Fiscal Year'].str.contains(year, na=False)
-            top_items = df[fiscal_mask]['Item Name'].value_counts().head(10)
-
-            if not top_items.empty:
-                return "🛒 Most frequently purchased items in FY{}:\n{}".format(
-                    year,
-                    "\n".join([f"- {item} ({count})" 
-                            for item, count in top_items.items()])
-                )  # Properly closed parentheses
-            else:
-                return f"⚠️ No purchase data found for FY{year}"
-
-    # ===== NORMALIZED UNSPSC CODE =====
-    elif "normalized unspsc for" in question:
-        item = re.search(r"for (.+?)\??$", question).group(1).strip().upper()
-        items = df[df['Item Name'].str.upper().str.contains(item, na=False)]
-
-        if not items.empty:
-            unspsc = items.iloc[0]['Normalized UNSPSC']
-            return f"🏷️ Normalized UNSPSC for {item}: {unspsc}"
+# Each handler takes the DataFrame and the slots from _parse() (with the
+# trigger match under 'match') and returns the answer, or None to let the
+# next matching intent have a go.
+
+def _handle_zip_purchases(df, slots):
+    zip_code = slots['zip']
+    if zip_code:
+        # Search in both Location and Supplier Zip Code columns
+        location_mask = _contains_mask(df, 'Location', zip_code)
+        supplier_zip_mask = _supplier_zip_mask(df, zip_code)
+        purchases = df[location_mask | supplier_zip_mask]
+
+        if not purchases.empty:
+            head = purchases.head(20)
+            names = head['Item Name'].to_numpy()
+            prices = head['Total Price'].to_numpy()
+            dates = head['Purchase Date'].dt.strftime('%Y-%m-%d').to_numpy()
+            return "📍 Purchases for location {}:\n{}".format(
+                zip_code,
+                "\n".join(f"- {n} (${p:,.2f}, {d})" for n, p, d in zip(names, prices, dates))
+            )
         else:
-            return f"⚠️ No UNSPSC code found for {item}"
-
-    # ===== TRANSACTIONS BY SUB-ACQUISITION METHOD =====
-    elif "transactions with sub-acquisition method" in question:
-        method = re.search(r"method (.+?)\??$", question).group(1).strip()
-        transactions = df[df['Sub-Acquisition Method'].str.contains(method, case=False, na=False)]
-
-        if not transactions.empty:
-            return "📝 Transactions with sub-acquisition method '{}':\n{}".format(
-                method,
-                "\n".join([f"- {row['Item Name']} (${row['Total Price']:,.2f})" 
-                        for _, row in transactions.head(10).iterrows()])
-            )  # Properly closed parentheses
+            return f"⚠️ No purchases found for ZIP code {zip_code}"
+
+def _handle_acquisition_method_purchases(df, slots):
+    method_match = _ACQ_METHOD_RE.search(slots['question'])
+    if method_match:
+        method = method_match.group(1).strip()
+        year = slots['year']
+
+        if year is not None:
+            method_mask = _contains_mask(df, 'Acquisition Method', method)
+            year_mask = df['Year'] == year
+            count = df[method_mask & year_mask].shape[0]
+            return f"📦 Number of {method} purchases in {year}: {count}"
         else:
-            return f"⚠️ No transactions found with sub-acquisition method '{method}'"
-
-    # ===== ITEM CLASSIFICATION =====
-    if "segment and family classification" in question:
-        item = re.search(r"the (.+?)\??$", question).group(1).strip().upper()
-        # Handle NA values properly
-        classification = df[df['Item Name'].notna() & 
-                            df['Item Name'].str.upper().str.contains(item)]
-        if not classification.empty:
-            row = classification.iloc[0]
-            return (f"🏷️ Classification for {item}:\n"
-                    f"- Segment: {row.get('Segment Title', 'N/A')}\n"
-                    f"- Family: {row.get('Family Title', 'N/A')}")
+            count = df[_contains_mask(df, 'Acquisition Method', method)].shape[0]
+            return f"📦 Total {method} purchases: {count}"
+
+def _handle_top_suppliers(df, slots):
+    # Number defaults to 3 if not specified
+    n = slots['top_n'] if slots['top_n'] is not None else 3
+
+    year = slots['year']
+    time_period = f"in {year}" if year is not None else "overall"
+
+    suppliers = _top_suppliers(year, n)
+    if suppliers is None:
+        suppliers = _top_n(_category_sums(df, 'Supplier Name', year=year), n)
+
+    if not suppliers.empty:
+        return "🏆 Top {} suppliers {}:\n{}".format(
+            n,
+            time_period,
+            "\n".join([f"{i+1}. {supplier}: ${amt:,.2f}"
+                    for i, (supplier, amt) in enumerate(suppliers.items())])
+        )
+    else:
+        return f"⚠️ No supplier data found {time_period}"
+
+def _handle_supplier_code_spend(df, slots):
+    code_match = _SUPPLIER_CODE_RE.search(slots['question'])
+    if code_match:
+        code = code_match.group(1).strip()
+        rows = _code_rows.get(code)
+
+        if rows is not None:
+            total = _price_total(rows)
+            supplier_name = df['Supplier Name'].iat[rows[0]]
+            return (f"🏢 Total spend for supplier code {code} ({supplier_name}): "
+                    f"${total:,.2f}\n"
+                    f"- Number of purchases: {len(rows)}")
         else:
-            return f"⚠️ No classification found for item {item}"
-
-    # ===== ITEM QUANTITY BY CODE =====
-    elif "how many items of" in question and "bought in" in question:
-        match = re.search(r"items of (\w+) (?:bought|purchased) in (\d{4})", question)
-        if match:
-            item_code = match.group(1)
-            year = int(match.group(2))
-            # Search in both Classification Codes and Normalized UNSPSC
-            mask = ((df['Classification Codes'].astype(str).str.contains(item_code)) |
-                    (df['Normalized UNSPSC'].astype(str).str.contains(item_code))) & \
-                    (df['Year'] == year)
-            total = df[mask]['Quantity'].sum()
-            return f"📦 Total quantity of items with code {item_code} in {year}: {int(total)}"
-
-    # ===== TOP SUPPLIERS BY SPEND =====
-    elif "top three suppliers based on total spend" in question:
-        year_match = re.search(r"in (\d{4})", question)
-        if year_match:
-            year = int(year_match.group(1))
-            top_suppliers = df[df['Year'] == year].groupby('Supplier Name')['Total Price']\
-                        .sum().nlargest(3)
-            return "🏆 Top 3 suppliers in {}:\n{}".format(
+            return f"⚠️ No purchases found for supplier code {code}"
+
+def _handle_highest_spend_type(df, slots):
+    year = slots['year']
+
+    top_type = _top_acquisition_type(year)
+    if top_type is None:
+        top_type = _top_n(_category_sums(df, 'Acquisition Type', year=year), 1)
+
+    if not top_type.empty:
+        return (f"📊 Highest spending acquisition type "
+                f"{'in '+str(year) if year is not None else ''}:\n"
+                f"- {top_type.index[0]}: ${top_type.iloc[0]:,.2f}")
+    else:
+        return f"⚠️ No data found for specified year"
+
+def _handle_frequent_items_fiscal_year(df, slots):
+    year = slots['fiscal_year']
+    if year:
+        fiscal_mask = _fiscal_year_mask(df, year)
+        top_items = _observed_counts(df[fiscal_mask]['Item Name']).head(10)
+
+        if not top_items.empty:
+            return "🛒 Most frequently purchased items in FY{}:\n{}".format(
                 year,
-                "\n".join([f"- {supplier}: ${amt:,.2f}" 
-                        for supplier, amt in top_suppliers.items()])
-            )  # Fixed indentation
-        else:
-            top_suppliers = df.groupby('Supplier Name')['Total Price']\
-                        .sum().nlargest(3)
-            return "🏆 Top 3 suppliers overall:\n{}".format(
-                "\n".join([f"- {supplier}: ${amt:,.2f}" 
-                        for supplier, amt in top_suppliers.items()])
-            )  # Fixed indentation
-
-    # ===== DEPARTMENT SPENDING =====
-    elif "total spend for the department" in question and "fiscal year" in question:
-        dept_match = re.search(r"department (.+?) in fiscal year (\d{4})", question)
-        if dept_match:
-            dept = dept_match.group(1).strip()
-            year = int(dept_match.group(2))
-            # Handle department name variations
-            dept_mask = df['Department Name'].str.contains(dept, case=False, na=False)
-            year_mask = df['Fiscal Year'].str.contains(str(year), na=False)
-            total = df[dept_mask & year_mask]['Total Price'].sum()
-            return f"🏛️ Total spend for {dept.title()} in FY{year}: ${total:,.2f}"
-
-    # ===== PURCHASES BY LOCATION =====
-    elif "purchases linked to location" in question:
-        loc_match = re.search(r"location (\d+)", question)
-        if loc_match:
-            zip_code = loc_match.group(1)
-            purchases = df[df['Location'].astype(str).str.contains(zip_code)]
-            if not purchases.empty:
-                return "📍 Purchases for location {}:\n{}".format(
-                    zip_code,
-                    "\n".join([f"- {row['Item Name']} (${row['Total Price']:,.2f})" 
-                            for _, row in purchases.head(10).iterrows()])
-                )  # Fixed indentation
-            else:
-                return f"⚠️ No purchases found for location {zip_code}"
-
-    # ===== SPENDING BY SUPPLIER CODE =====
-    elif "total price for all purchases under supplier code" in question:
-        code_match = re.search(r"supplier code (\d+)", question)
-        if code_match:
-            code = code_match.group(1)
-            total = df[df['Supplier Code'].astype(str) == code]['Total Price'].sum()
-            return f"🏢 Total spend for supplier code {code}: ${total:,.2f}"
-
-     # ===== ITEMS BY ACQUISITION TYPE =====
-    if "list all items purchased under the acquisition type" in question:
-        acq_type = question.split("acquisition type")[1].strip()
-        items = df[df['Acquisition Type'].str.contains(acq_type, case=False)][['Item Name', 'Item Description']].drop_duplicates()
-        if not items.empty:
-            return "📋 Items purchased under {}:\n{}".format(
-                acq_type,
-                "\n".join([f"- {row['Item Name']} ({row['Item Description']})" 
-                          for _, row in items.iterrows()][:100])) # Limit to 100 items
-        else:
-            return f"⚠️ No items found under acquisition type {acq_type}"
-
-    # ===== PURCHASES BY SUPPLIER QUALIFICATION =====
-    if "purchases from suppliers with the qualification" in question:
-        quals = question.split("qualification")[1].strip().upper()
-        suppliers = df[df['Supplier Qualifications'].str.contains(quals, na=False)]
-        if not suppliers.empty:
-            return "🏢 Purchases from suppliers with {} qualification:\n{}".format(
-                quals,
-                "\n".join([f"- {row['Supplier Name'].title()} ({row['Item Name']})" 
-                          for _, row in suppliers.iterrows()][:100]))  # Limit to 100
-        else:
-            return f"⚠️ No purchases found from suppliers with {quals} qualification"
-
-    # ===== QUANTITY AND UNIT PRICE FOR SPECIFIC PO =====
-    if "quantity and unit price for the item" in question and "purchase order" in question:
-        item = re.search(r"item (.+?) in", question).group(1).upper()
-        po = re.search(r"purchase order (.+?)$", question).group(1).strip()
-        
-        purchase = df[(df['Purchase Order Number'].astype(str).str.contains(po)) & 
-                    (df['Item Name'].astype(str).str.contains(item, case=False))]
-        
-        if not purchase.empty:
-            row = purchase.iloc[0]
-            return f"📊 For item {item} in PO {po}:\n- Quantity: {row['Quantity']}\n- Unit Price: {format_currency(row['Unit Price'])}"
-        else:
-            return f"⚠️ No matching purchase found for item {item} in PO {po}"
-
-    # ===== COUNT OF PURCHASES BY ACQUISITION METHOD =====
-    if "how many purchases were made using the acquisition method" in question:
-        method = question.split("acquisition method")[1].strip()
-        count = df[df['Acquisition Method'].str.contains(method, case=False)].shape[0]
-        return f"📦 Number of purchases using {method}: **{count}**"
-
-    # ===== SEGMENT/FAMILY CLASSIFICATION =====
-    if "segment and family classification does the" in question:
-        item = question.split("the")[1].strip().upper()
-        classification = df[df['Item Name'].str.contains(item, case=False)]
-        if not classification.empty:
-            row = classification.iloc[0]
-            return f"🏷️ Classification for {item}:\n- Segment: {row.get('Segment Title', 'N/A')}\n- Family: {row.get('Family Title', 'N/A')}"
-        else:
-            return f"⚠️ No classification found for item {item}"
-
-    # ===== TOTAL SPEND BY SUPPLIER IN FISCAL YEAR =====
-    fiscal_year_match = re.search(r"total spend by (.+?) in (?:the )?fiscal year (\d{4})", question)
-    if fiscal_year_match:
-        supplier = fiscal_year_match.group(1).strip()
-        year = int(fiscal_year_match.group(2))
-        
-        supplier_mask = df['Supplier Name'].str.lower().str.contains(supplier.lower())
-        fiscal_year_mask = df['Fiscal Year'].str.contains(str(year))
-        
-        matched = df[supplier_mask & fiscal_year_mask]
-        if not matched.empty:
-            total = matched['Total Price'].sum()
-            return f"💸 Total spend by {supplier.title()} in FY{year}: **${total:,.2f}**"
+                "\n".join([f"- {item} ({count})"
+                        for item, count in top_items.items()])
+            )
         else:
-            return f"⚠️ No spending found for {supplier.title()} in FY{year}"
-
-    # ===== CALCARD SPENDING IN FISCAL YEAR =====
-    if "calcard" in question and "fiscal year" in question:
-        year = int(re.search(r"fiscal year (\d{4})", question).group(1))
-        calcard_mask = (df['CalCard'].str.upper() == "YES") & (df['Fiscal Year'].str.contains(str(year)))
-        total = df[calcard_mask]['Total Price'].sum()
-        return f"💳 Total CalCard spending in FY{year}: **${total:,.2f}**"
-
-    # ===== ITEMS BY SUPPLIER AND LPA NUMBER =====
-    lpa_match = re.search(r"how many items? (?:were|was) purchased from (.+?) using lpa number ([A-Za-z0-9\-]+)", question)
-    if lpa_match:
-        supplier = lpa_match.group(1).strip()
-        lpa_num = lpa_match.group(2).strip()
-        
-        supplier_mask = df['Supplier Name'].str.lower().str.contains(supplier.lower())
-        lpa_mask = df['LPA Number'].astype(str).str.lower() == lpa_num.lower()
-        
-        count = df[supplier_mask & lpa_mask].shape[0]
-        return f"📦 Items purchased from {supplier.title()} under LPA {lpa_num}: **{count}**"
-
-    # ===== ACQUISITION METHODS USED IN YEAR =====
-    if "acquisition methods" in question and ("used" in question or "for purchases" in question):
-        year_match = re.search(r"(\d{4})", question)
-        if year_match:
-            year = int(year_match.group(1))
-            methods = df[df['Year'] == year]['Acquisition Method'].value_counts()
-            if not methods.empty:
-                return "📝 Acquisition methods used in {}:\n{}".format(
-                    year,
-                    "\n".join([f"- {method}: {count}" for method, count in methods.items()])
-                )
-            else:
-                return f"⚠️ No acquisition method data found for {year}"
-
-    # ===== PURCHASE ORDER NUMBER FOR REQUISITION =====
-    po_match = re.search(r"purchase order number (?:for|of) (?:the )?requisition (\w+)", question)
-    if po_match:
-        req_num = po_match.group(1).upper()
-        po_number = df[df['Requisition Number'].astype(str).str.upper() == req_num]['Purchase Order Number'].iloc[0]
-        return f"🔢 Purchase Order Number for Requisition {req_num}: **{po_number}**"
-    
-
-        # ===== ORDERS FROM SUPPLIER ACROSS MULTIPLE YEARS =====
-    if "total orders from" in question and "and" in question:
-        supplier_match = re.search(r"total orders from (.+?) (?:in|during) (.+)", question)
-        if supplier_match:
-            supplier_query = supplier_match.group(1).strip()
-            years_str = supplier_match.group(2)
-            years = [int(y) for y in re.findall(r"\d{4}", years_str)]
-            
-            if not years:
-                return "⚠️ Please specify valid year(s)"
-                
-            supplier_mask = df['Supplier Name'].astype(str).str.lower().str.contains(supplier_query.lower())
-            results = []
-            
-            for year in years:
-                year_mask = df['Year'] == year
-                count = df[supplier_mask & year_mask].shape[0]
-                results.append(f"- {year}: {count} orders")
-            
-            return f"📦 Orders from {supplier_query.title()}:\n" + "\n".join(results)
-
-    # ===== TOTAL QUANTITY OF ITEM PURCHASED =====
-    quantity_match = re.search(r"(?:total|how many) quantity of (.+?) (?:purchased|bought|ordered) (?:in|during) (\d{4})", question)
-    if not quantity_match:
-        quantity_match = re.search(r"(?:total|how many) (.+?) (?:were|was) (?:purchased|bought|ordered) (?:in|during) (\d{4})", question)
-    
-    if quantity_match:
-        item_query = quantity_match.group(1).strip()
-        year = int(quantity_match.group(2))
-        
-        item_mask = (
-            df['Item Name'].astype(str).str.lower().str.contains(item_query.lower()) |
-            df['Item Description'].astype(str).str.lower().str.contains(item_query.lower())
+            return f"⚠️ No purchase data found for FY{year}"
+
+def _handle_normalized_unspsc(df, slots):
+    item = _UNSPSC_ITEM_RE.search(slots['question']).group(1).strip().upper()
+    items = df[_contains_mask(df, 'Item Name', item)]
+
+    if not items.empty:
+        unspsc = items.iloc[0]['Normalized UNSPSC']
+        return f"🏷️ Normalized UNSPSC for {item}: {unspsc}"
+    else:
+        return f"⚠️ No UNSPSC code found for {item}"
+
+def _handle_sub_method_transactions(df, slots):
+    method = _SUB_METHOD_RE.search(slots['question']).group(1).strip()
+    transactions = df[_contains_mask(df, 'Sub-Acquisition Method', method)]
+
+    if not transactions.empty:
+        head = transactions.head(10)
+        return "📝 Transactions with sub-acquisition method '{}':\n{}".format(
+            method,
+            "\n".join(f"- {n} (${p:,.2f})"
+                    for n, p in zip(head['Item Name'].to_numpy(), head['Total Price'].to_numpy()))
         )
-        year_mask = df['Year'] == year
-        total_quantity = df[item_mask & year_mask]['Quantity'].sum()
-        
-        if not pd.isna(total_quantity):
-            return f"📦 Total quantity of {item_query} purchased in {year}: **{int(total_quantity)}**"
-        else:
-            return f"⚠️ No quantity data found for {item_query} in {year}"
-        
-        # ===== COUNT OF ITEMS ORDERED IN YEAR =====
-    if re.search(r"how many items? (?:were|was) ordered? in (\d{4})", question):
-        year = int(re.search(r"\d{4}", question).group())
-        count = df[df['Year'] == year]['Item Name'].count()
-        return f"📦 Total items ordered in {year}: **{count}**"
-
-    # ===== COUNT OF SPECIFIC ITEMS PURCHASED =====
-    match = re.search(r"how many (.+?) (?:were|was) (?:purchased|bought|ordered) (?:in|during) (\d{4})", question)
-    if match:
-        item_query = match.group(1).strip()
-        year = int(match.group(2))
-        
-        # Clean item names for better matching
-        item_mask = (
-            df['Item Name'].astype(str).str.lower().str.contains(item_query, na=False) |
-            df['Item Description'].astype(str).str.lower().str.contains(item_query, na=False)
+    else:
+        return f"⚠️ No transactions found with sub-acquisition method '{method}'"
+
+def _handle_item_classification(df, slots):
+    item = _CLASSIFICATION_ITEM_RE.search(slots['question']).group(1).strip().upper()
+    # Handle NA values properly
+    classification = df[_contains_mask(df, 'Item Name', item)]
+    if not classification.empty:
+        row = classification.iloc[0]
+        return (f"🏷️ Classification for {item}:\n"
+                f"- Segment: {row.get('Segment Title', 'N/A')}\n"
+                f"- Family: {row.get('Family Title', 'N/A')}")
+    else:
+        return f"⚠️ No classification found for item {item}"
+
+def _handle_item_code_quantity(df, slots):
+    match = slots['match']
+    item_code = match.group(1)
+    year = int(match.group(2))
+    # Search in both Classification Codes and Normalized UNSPSC
+    mask = (_code_mask(df, 'Classification Codes', item_code) |
+            _code_mask(df, 'Normalized UNSPSC', item_code)) & (df['Year'] == year)
+    total = df[mask]['Quantity'].sum()
+    return f"📦 Total quantity of items with code {item_code} in {year}: {int(total)}"
+
+def _handle_top_three_suppliers(df, slots):
+    year = slots['year']
+    top_suppliers = _top_suppliers(year, 3)
+    if top_suppliers is None:
+        top_suppliers = _top_n(_category_sums(df, 'Supplier Name', year=year), 3)
+
+    if year is not None:
+        return "🏆 Top 3 suppliers in {}:\n{}".format(
+            year,
+            "\n".join([f"- {supplier}: ${amt:,.2f}"
+                    for supplier, amt in top_suppliers.items()])
         )
-        year_mask = df['Year'] == year
-        count = df[item_mask & year_mask].shape[0]
-        
-        return f"📦 Number of {item_query} purchased in {year}: **{count}**"
-
-    # ===== COUNT OF ORDERS FROM SUPPLIER IN YEAR =====
-    match = re.search(r"(?:total|how many) orders? (?:from|of|for) (.+?) (?:in|during) (\d{4})", question)
-    if match:
-        supplier_query = match.group(1).strip()
-        year = int(match.group(2))
-        
-        supplier_mask = df['Supplier Name'].astype(str).str.lower().str.contains(supplier_query, na=False)
-        year_mask = df['Year'] == year
-        count = df[supplier_mask & year_mask].shape[0]
-        
-        return f"📦 Orders from {supplier_query.title()} in {year}: **{count}**"
-    
-        # Total price of specific items in a year
-    match = re.search(r"total (?:price|spend|spending|amount) (?:of|for) ([\w\s\-]+) (?:purchased|bought)? (?:in|for|during) (\d{4})", question)
-    if match:
-        item_query = match.group(1).strip().lower()
-        year = int(match.group(2))
-        
-        # Clean item names for better matching
-        df['Item_Clean'] = df['Item Name'].astype(str).str.lower().str.strip()
-        
-        # Find matching items
-        matched = df[(df['Item_Clean'].str.contains(item_query, na=False)) & 
-                  (df['Year'] == year)]
-        
-        if not matched.empty:
-            total = matched['Total Price'].sum()
-            example_item = matched['Item Name'].mode()[0]
-            return f"💸 Total spending on {item_query} in {year}: **${total:,.2f}**\n(Example item: {example_item})"
-        else:
-            return f"⚠️ No spending found for '{item_query}' in {year}"
-
-    # CalCard spending in a year
-    match = re.search(r"(?:total|how much) (?:calcard|cal card) (?:spend|spending|amount) (?:in|for|during) (\d{4})", question)
-    if not match:
-        match = re.search(r"(?:what was|what's) (?:the)? (?:calcard|cal card) (?:spend|spending|amount) (?:in|for|during) (\d{4})", question)
-    if match:
-        year = int(match.group(1))
-        calcard_spending = df[(df['CalCard'].str.upper() == "YES") & 
-                            (df['Year'] == year)]['Total Price'].sum()
-        return f"💳 Total CalCard spending in {year}: **${calcard_spending:,.2f}**"
-        # Extract any alphanumeric order number from the question
-    order_num_match = re.search(r'(?:requisition|req|purchase order|po)[\s\-]?(?:number|no|#)?[\s\-]*([a-z0-9\-\.]+)', question, re.IGNORECASE)
-    
-    if order_num_match:
-        search_num = order_num_match.group(1).upper()
-        
-        # Create a mask that searches both columns with exact matches
-        mask = ((df['Requisition Number'].astype(str).str.upper() == search_num) | (df['Purchase Order Number'].astype(str).str.upper() == search_num))
-        
-        # Also try partial matches if exact match not found
-        if not mask.any():
-            mask = (
-                (df['Requisition Number'].astype(str).str.upper().str.contains(search_num)) |
-                (df['Purchase Order Number'].astype(str).str.upper().str.contains(search_num)
-            ))
-        
-        matching_orders = df[mask]
-        
-        if not matching_orders.empty:
-            # Find the best match (prioritize exact matches)
-            if (df['Requisition Number'].astype(str).str.upper() == search_num).any():
-                order = df[df['Requisition Number'].astype(str).str.upper() == search_num].iloc[0]
-            elif (df['Purchase Order Number'].astype(str).str.upper() == search_num).any():
-                order = df[df['Purchase Order Number'].astype(str).str.upper() == search_num].iloc[0]
-            else:
-                order = matching_orders.iloc[0]
-            
-            return format_order_details(order)
-        else:
-            return f"⚠️ No order found with number {search_num}"
-
-    # Most expensive item
-    if "most expensive" in question and ("item" in question or "purchase" in question):
-        if 'Total Price' in df.columns and 'Item Name' in df.columns:
-            most_expensive = df.loc[df['Total Price'].idxmax()]
-            return (f"💎 Most expensive item purchased: **{most_expensive['Item Name']}**\n"
-                   f"- Price: **{format_currency(most_expensive['Total Price'])}**\n"
-                   f"- Supplier: {most_expensive['Supplier Name'].title()}\n"
-                   f"- Date: {most_expensive['Purchase Date'].strftime('%m/%d/%Y') if pd.notna(most_expensive['Purchase Date']) else 'N/A'}")
-
-    # Date range queries
-    match = re.search(r"orders? between (\w+)\s+(\d{4}) and (\w+)\s+(\d{4})", question)
-    if match:
-        start_month, start_year, end_month, end_year = match.groups()
-        start_date = pd.to_datetime(f"{start_month} 1, {start_year}")
-        end_date = pd.to_datetime(f"{end_month} 1, {end_year}") + pd.offsets.MonthEnd(1)
-        
-        mask = (df['Purchase Date'] >= start_date) & (df['Purchase Date'] <= end_date)
-        result = df[mask]
-        return f"📅 Orders between {start_date.strftime('%b %Y')} and {end_date.strftime('%b %Y')}: **{len(result)}**"
-
-    # Suppliers by ZIP code
-    match = re.search(r"(?:list|show|all) suppliers? (?:from|in|with) zip(?: code)?\s*(\d{5})", question)
-    if match:
-        zip_code = match.group(1)
-        suppliers = df[df['Supplier Zip Code'].astype(str).str.contains(zip_code)]['Supplier Name'].unique()
-        if len(suppliers) > 0:
-            return f"🏢 Suppliers from ZIP {zip_code}:\n\n" + "\n".join([f"- {str(s).title()}" for s in suppliers[:50]]) + \
-                  f"\n\n(Showing {min(50, len(suppliers))} of {len(suppliers)} total suppliers)"
-        else:
-            return f"⚠️ No suppliers found in ZIP code {zip_code}"
-
-    # Suppliers with qualifications
-    match = re.search(r"suppliers? with ([\w\-]+) qualification", question)
-    if match:
-        qual = match.group(1).upper()
-        suppliers = df[df['Supplier Qualifications'].str.contains(qual, na=False)]['Supplier Name'].unique()
-        if len(suppliers) > 0:
-            return f"🏢 Suppliers with {qual} qualification:\n\n" + "\n".join([f"- {str(s).title()}" for s in suppliers[:50]]) + \
-                  f"\n\n(Showing {min(50, len(suppliers))} of {len(suppliers)} total suppliers)"
-        else:
-            return f"⚠️ No suppliers found with {qual} qualification"
-
-    # Most common delivery location
-    if "most common delivery location" in question or "location with most orders" in question:
-        if 'Location' in df.columns:
-            top_location = df['Location'].value_counts().idxmax()
-            count = df['Location'].value_counts().max()
-            return f"📍 Most common delivery location: **{top_location}** ({count} orders)"
-
-    # ===== NEW QUESTION PATTERNS ADDED =====
-    
-    # Total price of [item] in [year]?
-    match = re.search(r"total (?:price|spend|spending|amount) (?:of|for) ([\w\s\-]+) (?:in|for|during) (\d{4})", question)
-    if not match:
-        match = re.search(r"how much (?:was|did) (?:we|they) spend on ([\w\s\-]+) (?:in|for|during) (\d{4})", question)
-    if match:
-        item_query = match.group(1).strip().lower()
-        year = int(match.group(2))
-        matched = df[(df['Item Name'].str.lower().str.contains(item_query, na=False)) & 
-                    (df['Year'] == year)]
-        total = matched['Total Price'].sum()
-        if not matched.empty:
-            actual_name = matched['Item Name'].mode()[0]
-            return f"💸 Total spending on {actual_name} in {year}: **${total:,.2f}**"
+    else:
+        return "🏆 Top 3 suppliers overall:\n{}".format(
+            "\n".join([f"- {supplier}: ${amt:,.2f}"
+                    for supplier, amt in top_suppliers.items()])
+        )
+
+def _handle_department_spend(df, slots):
+    dept_match = _DEPARTMENT_FY_RE.search(slots['question'])
+    if dept_match:
+        dept = dept_match.group(1).strip()
+        year = int(dept_match.group(2))
+        # Handle department name variations
+        dept_mask = _contains_mask(df, 'Department Name', dept)
+        year_mask = _fiscal_year_mask(df, year)
+        total = _price_total(dept_mask & year_mask)
+        return f"🏛️ Total spend for {dept.title()} in FY{year}: ${total:,.2f}"
+
+def _handle_linked_location(df, slots):
+    loc_match = _LOCATION_RE.search(slots['question'])
+    if loc_match:
+        zip_code = loc_match.group(1)
+        purchases = df[_contains_mask(df, 'Location', zip_code)]
+        if not purchases.empty:
+            head = purchases.head(10)
+            return "📍 Purchases for location {}:\n{}".format(
+                zip_code,
+                "\n".join(f"- {n} (${p:,.2f})"
+                        for n, p in zip(head['Item Name'].to_numpy(), head['Total Price'].to_numpy()))
+            )
         else:
-            return f"⚠️ No spending found for '{item_query}' in {year}"
-
-    # List of suppliers?
-    if re.search(r"(?:list|show|name|all|give me) (?:the|of|all)? ?suppliers?", question):
-        if 'Supplier Name' in df.columns:
-            suppliers = df['Supplier Name'].str.title().unique()
-            return "🏢 List of Suppliers:\n\n" + "\n".join([f"- {supplier}" for supplier in suppliers[:10]]) + \
-                  f"\n\n(Showing 10 of {len(suppliers)} total suppliers)"
+            return f"⚠️ No purchases found for location {zip_code}"
+
+def _handle_supplier_code_total(df, slots):
+    code_match = _SUPPLIER_CODE_RE.search(slots['question'])
+    if code_match:
+        code = code_match.group(1)
+        rows = _code_rows.get(code)
+        total = _price_total(rows) if rows is not None else 0.0
+        return f"🏢 Total spend for supplier code {code}: ${total:,.2f}"
+
+def _handle_items_by_acquisition_type(df, slots):
+    acq_type = slots['question'].split("acquisition type")[1].strip()
+    items = df[_contains_mask(df, 'Acquisition Type', acq_type)][['Item Name', 'Item Description']].drop_duplicates()
+    if not items.empty:
+        head = items.head(100)  # Limit to 100 items
+        return "📋 Items purchased under {}:\n{}".format(
+            acq_type,
+            "\n".join(f"- {n} ({d})"
+                      for n, d in zip(head['Item Name'].to_numpy(), head['Item Description'].to_numpy())))
+    else:
+        return f"⚠️ No items found under acquisition type {acq_type}"
+
+def _handle_qualified_supplier_purchases(df, slots):
+    quals = slots['question'].split("qualification")[1].strip().upper()
+    suppliers = df[df['Supplier Qualifications'].str.contains(quals, regex=False, na=False)]
+    if not suppliers.empty:
+        head = suppliers.head(100)  # Limit to 100
+        return "🏢 Purchases from suppliers with {} qualification:\n{}".format(
+            quals,
+            "\n".join(f"- {s.title()} ({n})"
+                      for s, n in zip(head['Supplier Name'].to_numpy(), head['Item Name'].to_numpy())))
+    else:
+        return f"⚠️ No purchases found from suppliers with {quals} qualification"
+
+def _handle_po_item_quantity(df, slots):
+    question = slots['question']
+    item = _PO_ITEM_RE.search(question).group(1).upper()
+    po = _PO_NUMBER_RE.search(question).group(1).strip()
+
+    purchase = df[(df['Purchase Order Number'].astype(str).str.contains(po, regex=False, na=False)) &
+                (_contains_mask(df, 'Item Name', item))]
+
+    if not purchase.empty:
+        row = purchase.iloc[0]
+        return f"📊 For item {item} in PO {po}:\n- Quantity: {row['Quantity']}\n- Unit Price: {format_currency(row['Unit Price'])}"
+    else:
+        return f"⚠️ No matching purchase found for item {item} in PO {po}"
+
+def _handle_method_count(df, slots):
+    method = slots['question'].split("acquisition method")[1].strip()
+    count = df[_contains_mask(df, 'Acquisition Method', method)].shape[0]
+    return f"📦 Number of purchases using {method}: **{count}**"
+
+def _handle_segment_family_does(df, slots):
+    item = slots['question'].split("the")[1].strip().upper()
+    classification = df[_contains_mask(df, 'Item Name', item)]
+    if not classification.empty:
+        row = classification.iloc[0]
+        return f"🏷️ Classification for {item}:\n- Segment: {row.get('Segment Title', 'N/A')}\n- Family: {row.get('Family Title', 'N/A')}"
+    else:
+        return f"⚠️ No classification found for item {item}"
+
+def _handle_supplier_fiscal_year_spend(df, slots):
+    match = slots['match']
+    supplier = match.group(1).strip()
+    year = int(match.group(2))
+
+    spend = _fiscal_year_spend({'Supplier Name': {'$regex': re.escape(supplier), '$options': 'i'}}, year)
+    if spend is None:
+        supplier_mask = _contains_mask(df, 'Supplier Name', supplier)
+        fiscal_year_mask = _fiscal_year_mask(df, year)
+        mask = supplier_mask & fiscal_year_mask
+        spend = _price_total(mask), int(mask.sum())
+
+    total, count = spend
+    if count:
+        return f"💸 Total spend by {supplier.title()} in FY{year}: **${total:,.2f}**"
+    else:
+        return f"⚠️ No spending found for {supplier.title()} in FY{year}"
+
+def _handle_calcard_fiscal_year(df, slots):
+    match = slots['match']
+    year = int(match.group(1))
+    spend = _fiscal_year_spend({'CalCard': {'$regex': r'^\s*yes\s*$', '$options': 'i'}}, year)
+    if spend is None:
+        calcard_mask = (df['CalCard'] == "YES") & (_fiscal_year_mask(df, year))
+        total = _price_total(calcard_mask)
+    else:
+        total = spend[0]
+    return f"💳 Total CalCard spending in FY{year}: **${total:,.2f}**"
+
+def _handle_lpa_items(df, slots):
+    match = slots['match']
+    supplier = match.group(1).strip()
+    lpa_num = match.group(2).strip()
+
+    supplier_mask = _contains_mask(df, 'Supplier Name', supplier)
+    lpa_mask = df['_LPA Number_lc'] == lpa_num.lower()
+
+    count = df[supplier_mask & lpa_mask].shape[0]
+    return f"📦 Items purchased from {supplier.title()} under LPA {lpa_num}: **{count}**"
+
+def _handle_acquisition_methods_used(df, slots):
+    question = slots['question']
+    if "used" not in question and "for purchases" not in question:
+        return None
+    year = slots['any_year']
+    if year is not None:
+        methods = _observed_counts(df[df['Year'] == year]['Acquisition Method'])
+        if not methods.empty:
+            return "📝 Acquisition methods used in {}:\n{}".format(
+                year,
+                "\n".join([f"- {method}: {count}" for method, count in methods.items()])
+            )
         else:
-            return "⚠️ No 'Supplier Name' column in data."
-
-    # Total orders of [supplier]?
-    match = re.search(r"total orders? (?:of|from|by|for) ([\w\s\-]+)", question)
-    if match:
-        supplier_query = match.group(1).strip().lower()
-        matched = df[df['Supplier Name'].str.lower().str.contains(supplier_query, na=False)]
-        return f"📦 Total orders from {supplier_query.title()}: **{len(matched)}**"
-
-    # Total orders of [supplier] in [year]?
-    match = re.search(r"total orders? (?:of|from|by|for) ([\w\s\-]+) (?:in|for|during) (\d{4})", question)
-    if match:
-        supplier_query = match.group(1).strip().lower()
-        year = int(match.group(2))
-        matched = df[(df['Supplier Name'].str.lower().str.contains(supplier_query, na=False)) & 
-                    (df['Year'] == year)]
-        return f"📦 Total orders from {supplier_query.title()} in {year}: **{len(matched)}**"
-
-    # ===== ORIGINAL QUESTION HANDLING (KEPT AS IS) =====
-    
-    # Specific date: July 15, 2014
-    match = re.search(r"(?:on|made on|placed on|received on)? ?(\w+)\s+(\d{1,2}),?\s+(\d{4})", question)
-    if match:
-        month_name, day, year = match.group(1), int(match.group(2)), int(match.group(3))
-        month = month_str_to_number(month_name)
-        if month:
-            result = df[(df['Year'] == year) & (df['Month'] == month) & (df['Purchase Date'].dt.day == day)]
-            return f"📅 Total orders on {month_name.capitalize()} {day}, {year}: **{len(result)}**"
-
-    # Month + Year
-    match = re.search(r"(?:in|for|from) (\w+) (\d{4})", question)
-    if match:
-        month_name, year = match.group(1), int(match.group(2))
-        month = month_str_to_number(month_name)
-        if month:
-            result = df[(df['Year'] == year) & (df['Month'] == month)]
-            return f"📦 Total orders in {month_name.capitalize()} {year}: **{len(result)}**"
-
-    # Multiple years
-    years = re.findall(r"\b(20\d{2})\b", question)
-    if "order" in question and len(years) >= 2:
+            return f"⚠️ No acquisition method data found for {year}"
+
+def _handle_requisition_po_number(df, slots):
+    match = slots['match']
+    req_num = match.group(1).upper()
+    idx = _req_idx.get(req_num)
+    if idx is None:
+        return f"⚠️ No order found with requisition number {req_num}"
+    po_number = df['Purchase Order Number'].iat[idx]
+    return f"🔢 Purchase Order Number for Requisition {req_num}: **{po_number}**"
+
+def _handle_supplier_orders_by_years(df, slots):
+    match = slots['match']
+    supplier_query = match.group(1).strip()
+    years_str = match.group(2)
+    years = [int(y) for y in _ANY_YEAR_RE.findall(years_str)]
+
+    if not years:
+        return "⚠️ Please specify valid year(s)"
+
+    supplier_mask = _contains_mask(df, 'Supplier Name', supplier_query)
+    results = []
+
+    for year in years:
+        year_mask = df['Year'] == year
+        count = df[supplier_mask & year_mask].shape[0]
+        results.append(f"- {year}: {count} orders")
+
+    return f"📦 Orders from {supplier_query.title()}:\n" + "\n".join(results)
+
+def _handle_item_quantity(df, slots):
+    match = slots['match']
+    item_query = match.group(1).strip()
+    year = int(match.group(2))
+
+    item_mask = _item_mask(df, item_query)
+    year_mask = df['Year'] == year
+    total_quantity = df[item_mask & year_mask]['Quantity'].sum()
+
+    if not pd.isna(total_quantity):
+        return f"📦 Total quantity of {item_query} purchased in {year}: **{int(total_quantity)}**"
+    else:
+        return f"⚠️ No quantity data found for {item_query} in {year}"
+
+def _handle_items_ordered_count(df, slots):
+    year = slots['any_year']
+    count = df[df['Year'] == year]['Item Name'].count()
+    return f"📦 Total items ordered in {year}: **{count}**"
+
+def _handle_item_purchase_count(df, slots):
+    match = slots['match']
+    item_query = match.group(1).strip()
+    year = int(match.group(2))
+
+    item_mask = _item_mask(df, item_query)
+    year_mask = df['Year'] == year
+    count = df[item_mask & year_mask].shape[0]
+
+    return f"📦 Number of {item_query} purchased in {year}: **{count}**"
+
+def _handle_supplier_orders_year(df, slots):
+    match = slots['match']
+    supplier_query = match.group(1).strip()
+    year = int(match.group(2))
+
+    supplier_mask = _contains_mask(df, 'Supplier Name', supplier_query)
+    year_mask = df['Year'] == year
+    count = df[supplier_mask & year_mask].shape[0]
+
+    return f"📦 Orders from {supplier_query.title()} in {year}: **{count}**"
+
+def _handle_item_spend_year(df, slots):
+    match = slots['match']
+    item_query = match.group(1).strip().lower()
+    year = int(match.group(2))
+
+    # Find matching items
+    mask = _contains_mask(df, 'Item Name', item_query) & (df['Year'] == year)
+
+    if mask.any():
+        total = _price_total(mask)
+        example_item = df.loc[mask, 'Item Name'].mode()[0]
+        return f"💸 Total spending on {item_query} in {year}: **${total:,.2f}**\n(Example item: {example_item})"
+    else:
+        return f"⚠️ No spending found for '{item_query}' in {year}"
+
+def _handle_calcard_year(df, slots):
+    match = slots['match']
+    year = int(match.group(1))
+    calcard_spending = _price_total((df['CalCard'] == "YES") & (df['Year'] == year))
+    return f"💳 Total CalCard spending in {year}: **${calcard_spending:,.2f}**"
+
+def _handle_order_number(df, slots):
+    match = slots['match']
+    search_num = match.group(1).upper()
+
+    # Exact matches come straight from the key indices (requisition first)
+    idx = _req_idx.get(search_num)
+    if idx is None:
+        idx = _po_idx.get(search_num)
+    if idx is not None:
+        return format_order_details(df.iloc[idx])
+
+    # Otherwise fall back to a partial match on either number
+    matching_orders = df[_order_keys.str.contains(search_num, regex=False)]
+
+    if not matching_orders.empty:
+        return format_order_details(matching_orders.iloc[0])
+    else:
+        return f"⚠️ No order found with number {search_num}"
+
+def _handle_most_expensive_item(df, slots):
+    question = slots['question']
+    if "item" not in question and "purchase" not in question:
+        return None
+    if 'Total Price' in df.columns and 'Item Name' in df.columns:
+        most_expensive = df.loc[df['Total Price'].idxmax()]
+        return (f"💎 Most expensive item purchased: **{most_expensive['Item Name']}**\n"
+               f"- Price: **{format_currency(most_expensive['Total Price'])}**\n"
+               f"- Supplier: {most_expensive['Supplier Name'].title()}\n"
+               f"- Date: {most_expensive['Purchase Date'].strftime('%m/%d/%Y') if pd.notna(most_expensive['Purchase Date']) else 'N/A'}")
+
+def _handle_date_range(df, slots):
+    match = slots['match']
+    start_month, start_year, end_month, end_year = match.groups()
+    start_date = pd.to_datetime(f"{start_month} 1, {start_year}")
+    end_date = pd.to_datetime(f"{end_month} 1, {end_year}") + pd.offsets.MonthEnd(1)
+
+    lo = _sorted_ymd.searchsorted(_ymd(start_date.year, start_date.month, start_date.day), side='left')
+    hi = _sorted_ymd.searchsorted(_ymd(end_date.year, end_date.month, end_date.day), side='right')
+    return f"📅 Orders between {start_date.strftime('%b %Y')} and {end_date.strftime('%b %Y')}: **{hi - lo}**"
+
+def _handle_suppliers_by_zip(df, slots):
+    match = slots['match']
+    zip_code = match.group(1)
+    suppliers = df[_supplier_zip_mask(df, zip_code)]['Supplier Name'].unique()
+    if len(suppliers) > 0:
+        return f"🏢 Suppliers from ZIP {zip_code}:\n\n" + "\n".join([f"- {str(s).title()}" for s in suppliers[:50]]) + \
+              f"\n\n(Showing {min(50, len(suppliers))} of {len(suppliers)} total suppliers)"
+    else:
+        return f"⚠️ No suppliers found in ZIP code {zip_code}"
+
+def _handle_suppliers_by_qualification(df, slots):
+    match = slots['match']
+    qual = match.group(1).upper()
+    suppliers = df[df['Supplier Qualifications'].str.contains(qual, regex=False, na=False)]['Supplier Name'].unique()
+    if len(suppliers) > 0:
+        return f"🏢 Suppliers with {qual} qualification:\n\n" + "\n".join([f"- {str(s).title()}" for s in suppliers[:50]]) + \
+              f"\n\n(Showing {min(50, len(suppliers))} of {len(suppliers)} total suppliers)"
+    else:
+        return f"⚠️ No suppliers found with {qual} qualification"
+
+def _handle_most_common_location(df, slots):
+    if 'Location' in df.columns:
+        # value_counts is sorted, so the first row is the most common
+        counts = _TOP['location_counts']
+        top_location, count = counts.index[0], counts.iloc[0]
+        return f"📍 Most common delivery location: **{top_location}** ({count} orders)"
+
+def _handle_item_total_year(df, slots):
+    match = slots['match']
+    item_query = match.group(1).strip().lower()
+    year = int(match.group(2))
+    mask = _contains_mask(df, 'Item Name', item_query) & (df['Year'] == year)
+    total = _price_total(mask)
+    if mask.any():
+        actual_name = df.loc[mask, 'Item Name'].mode()[0]
+        return f"💸 Total spending on {actual_name} in {year}: **${total:,.2f}**"
+    else:
+        return f"⚠️ No spending found for '{item_query}' in {year}"
+
+def _handle_list_suppliers(df, slots):
+    if 'Supplier Name' in df.columns:
+        suppliers = df['Supplier Name'].str.title().unique()
+        return "🏢 List of Suppliers:\n\n" + "\n".join([f"- {supplier}" for supplier in suppliers[:10]]) + \
+              f"\n\n(Showing 10 of {len(suppliers)} total suppliers)"
+    else:
+        return "⚠️ No 'Supplier Name' column in data."
+
+def _handle_total_orders(df, slots):
+    match = slots['match']
+    supplier_query = match.group(1).strip().lower()
+    matched = df[_contains_mask(df, 'Supplier Name', supplier_query)]
+    return f"📦 Total orders from {supplier_query.title()}: **{len(matched)}**"
+
+def _handle_total_orders_year(df, slots):
+    match = slots['match']
+    supplier_query = match.group(1).strip().lower()
+    year = int(match.group(2))
+    matched = df[(_contains_mask(df, 'Supplier Name', supplier_query)) &
+                (df['Year'] == year)]
+    return f"📦 Total orders from {supplier_query.title()} in {year}: **{len(matched)}**"
+
+def _handle_specific_date(df, slots):
+    match = slots['match']
+    month_name, day, year = match.group(1), int(match.group(2)), int(match.group(3))
+    month = month_str_to_number(month_name)
+    if month:
+        count = _TOP['day_counts'].get((year, month, day), 0)
+        return f"📅 Total orders on {month_name.capitalize()} {day}, {year}: **{count}**"
+
+def _handle_month_year(df, slots):
+    match = slots['match']
+    month_name, year = match.group(1), int(match.group(2))
+    month = month_str_to_number(month_name)
+    if month:
+        count = _TOP['year_month_counts'].get((year, month), 0)
+        return f"📦 Total orders in {month_name.capitalize()} {year}: **{count}**"
+
+def _handle_orders_by_years(df, slots):
+    years = slots['years']
+    if len(years) >= 2:
         summary = []
         for y in years:
-            y = int(y)
-            count = len(df[df['Year'] == y])
+            count = _TOP['year_counts'].get(y, 0)
             summary.append(f"📦 {y}: {count} orders")
         return "📊 Total orders by year:\n\n" + "\n".join(summary)
 
-    # Single year
-    match = re.search(r"(?:how many|number of)? ?orders (?:were )?(?:placed|made|received)? ?(?:in|during|for)? ?(\d{4})", question)
-    if match:
-        year = int(match.group(1))
-        result = df[df['Year'] == year]
-        return f"📦 Total orders in {year}: **{len(result)}**"
-    
-    # Quarter with highest spending in a specific year
-    match = re.search(r"quarter.*highest.*(?:in|for)? ?(\d{4})", question)
-    if match:
-        year = int(match.group(1))
-        df_year = df[df['Year'] == year]
-        if df_year.empty:
-            return f"⚠️ No data for year {year}."
-        spending = df_year.groupby('Quarter')['Total Price'].sum()
-        if spending.empty:
-            return f"⚠️ No spending data for year {year}."
-        max_q = spending.idxmax()
-        return f"💰 Quarter with highest spending in {year}: **Q{max_q} (${spending[max_q]:,.2f})**"
-
-    # Orders from suppliers in ZIP [zip]
-    match = re.search(r"orders? from suppliers? in zip (\d{5})", question)
-    if match:
-        zip_query = match.group(1)
-        col = 'Supplier Zip Code'
-        if col in df.columns:
-            matched = df[df[col].astype(str).str.contains(zip_query, na=False)]
-            return f"📦 Orders from suppliers in ZIP {zip_query}: **{len(matched)}**"
-        else:
-            return f"⚠️ No supplier ZIP column found in data."
+def _handle_orders_year(df, slots):
+    match = slots['match']
+    year = int(match.group(1))
+    count = _TOP['year_counts'].get(year, 0)
+    return f"📦 Total orders in {year}: **{count}**"
+
+def _handle_quarter_year(df, slots):
+    match = slots['match']
+    year = int(match.group(1))
+    if year not in _TOP['year_counts'].index:
+        return f"⚠️ No data for year {year}."
+    spending = _TOP['year_quarter_spend'].loc[year]
+    if spending.empty:
+        return f"⚠️ No spending data for year {year}."
+    max_q = spending.idxmax()
+    return f"💰 Quarter with highest spending in {year}: **Q{max_q} (${spending[max_q]:,.2f})**"
+
+def _handle_supplier_zip_orders(df, slots):
+    match = slots['match']
+    zip_query = match.group(1)
+    col = 'Supplier Zip Code'
+    if col in df.columns:
+        matched = df[_supplier_zip_mask(df, zip_query)]
+        return f"📦 Orders from suppliers in ZIP {zip_query}: **{len(matched)}**"
+    else:
+        return f"⚠️ No supplier ZIP column found in data."
+
+def _handle_delivered_zip(df, slots):
+    match = slots['match']
+    zip_query = match.group(1)
+    col = 'Location'
+    if col in df.columns:
+        matched = df[_contains_mask(df, col, zip_query)]
+        return f"📦 Orders delivered to {zip_query}: **{len(matched)}**"
+    else:
+        return f"⚠️ No delivery/location ZIP column found in data."
+
+def _handle_classification_code(df, slots):
+    match = slots['match']
+    code_query = match.group(1)
+    col = 'Classification Codes'
+    if col in df.columns:
+        count = int(_code_mask(df, col, code_query).sum())
+        return f"📦 Orders with classification code {code_query}: **{count}**"
+    else:
+        return f"⚠️ No classification code column found in data."
+
+def _handle_category(df, slots):
+    match = slots['match']
+    keyword = match.group(3).strip().lower()
+    # The titles form a small set of combinations, so match those and add up their rows
+    if keyword:
+        hit = np.zeros(len(_title_combo_sizes), dtype=bool)
+        for col, combo_codes in _title_combo_codes.items():
+            hit |= np.isin(combo_codes, _category_hits(col, keyword))
+        count = int(_title_combo_sizes[hit].sum())
+    else:
+        count = len(df) if _title_combo_codes else 0
+    if count > 0:
+        return f"📦 Total orders under '{keyword}' category: **{count}**"
+    else:
+        return f"❌ No orders found under the category '{keyword}'."
+
+def _handle_supplier_made_orders(df, slots):
+    match = slots['match']
+    supplier_query = match.group(1).strip().lower()
+    matched = df[_contains_mask(df, 'Supplier Name', supplier_query)]
+    return f"📦 {supplier_query.title()} made **{len(matched)}** orders."
+
+def _handle_spend_by_supplier(df, slots):
+    match = slots['match']
+    supplier_query = match.group(2).strip().lower()
+    mask = _contains_mask(df, 'Supplier Name', supplier_query)
+    total = _price_total(mask)
+    if mask.any():
+        actual_name = df.loc[mask, 'Supplier Name'].mode()[0]
+        return f"💸 Total spend by {actual_name}: **${total:,.2f}**"
+    else:
+        return f"⚠️ No spending found for supplier '{supplier_query}'"
+
+def _handle_orders_using(df, slots):
+    match = slots['match']
+    keyword = match.group(1).strip().lower()
+    keyword_cleaned = _ACQ_WORDS_RE.sub("", keyword).strip()
+    method_mask = _contains_mask(df, 'Acquisition Method', keyword_cleaned).to_numpy()
+    type_mask = _contains_mask(df, 'Acquisition Type', keyword_cleaned).to_numpy()
+    # An order whose method and type both match is still one order
+    total = int(np.count_nonzero(method_mask | type_mask))
+    if total > 0:
+        return f"⚙️ Total orders using **{match.group(1).strip()}**: **{total}**"
+    else:
+        return f"⚠️ No orders found using '{match.group(1).strip()}'"
+
+def _handle_total_spending_year(df, slots):
+    match = slots['match']
+    year = int(match.group(1))
+    total = _TOP['year_spend'].get(year, 0.0)
+    return f"💸 Total spending in {year}: **${total:,.2f}**"
+
+def _handle_average_monthly_spending(df, slots):
+    match = slots['match']
+    year_text = match.group(1)
+    years = [int(y) for y in _ANY_YEAR_RE.findall(year_text)]
+    avg_month = _TOP['year_avg_month']
+    if not avg_month.index.isin(years).any():
+        return f"⚠️ No records found for year(s): {', '.join(map(str, years))}"
+    response_lines = [f"📊 {y}: **${avg_month.get(y, 0.0):,.2f}**" for y in years]
+    return "📈 Average Monthly Spending:\n\n" + "\n".join(response_lines)
+
+def _handle_highest_quarter(df, slots):
+    spending = _TOP['quarter_spend']
+    max_q = spending.idxmax()
+    return f"💰 Quarter with highest spending: **Q{max_q} (${spending[max_q]:,.2f})**"
+
+def _handle_spending_on_supplier(df, slots):
+    match = slots['match']
+    supplier_query = match.group(1).strip().lower()
+    mask = _contains_mask(df, 'Supplier Name', supplier_query)
+    total = _price_total(mask)
+    if mask.any():
+        actual_name = df.loc[mask, 'Supplier Name'].mode()[0]
+        return f"💸 Total spending on {actual_name}: **${total:,.2f}**"
+    else:
+        return f"⚠️ No spending found for supplier '{supplier_query}'"
+
+def _handle_most_frequent_items(df, slots):
+    if "item" not in slots['question']:
+        return None
+    if 'Item Name' in df.columns:
+        items = _TOP['item_counts'].head(5)
+        return "🛒 Top 5 most frequently purchased items:\n\n" + "\n".join(
+            [f"- {item} ({count})" for item, count in items.items()]
+        )
 
-    # Orders delivered to [zip]
-    match = re.search(r"orders? delivered to (\d{5})", question)
-    if match:
-        zip_query = match.group(1)
-        col = 'Location'
-        if col in df.columns:
-            matched = df[df[col].astype(str).str.contains(zip_query, na=False)]
-            return f"📦 Orders delivered to {zip_query}: **{len(matched)}**"
-        else:
-            return f"⚠️ No delivery/location ZIP column found in data."
+def _handle_supplier_most_orders(df, slots):
+    question = slots['question']
+    if "supplier" not in question or not _MOST_ORDERS_RE.search(question):
+        return None
+    if 'Supplier Name' in df.columns:
+        counts = _TOP['supplier_counts']
+        top_supplier, count = counts.index[0], counts.iloc[0]
+        return f"🏢 Supplier with most orders: **{top_supplier}** ({count} orders)"
+    else:
+        return "⚠️ No 'Supplier Name' column in data."
+
+def _handle_spending_by_supplier(df, slots):
+    supplier_spending = _top_n(_TOP['supplier_spending'], 5)
+    return "🏢 Top 5 suppliers by total spending:\n\n" + "\n".join(
+        [f"- {supplier}: ${amount:,.2f}" for supplier, amount in supplier_spending.items()]
+    )
 
-    # Orders with classification code [code]?
-    match = re.search(r"classification code (\d+)", question)
-    if match:
-        code_query = match.group(1)
-        col = 'Classification Codes'
-        if col in df.columns:
-            matched = df[df[col].astype(str).str.contains(code_query, na=False)]
-            return f"📦 Orders with classification code {code_query}: **{len(matched)}**"
-        else:
-            return f"⚠️ No classification code column found in data."
-
-    # Orders under [category] category?
-    match = re.search(r"(orders|purchases) (under|in|from|for) (.+?) (category|item|group)?\??$", question)
-    if match:
-        keyword = match.group(3).strip().lower()
-        category_cols = ['Commodity Title', 'Class Title', 'Family Title', 'Segment Title']
-        found = False
-        total_matches = pd.DataFrame()
-        for col in category_cols:
-            if col in df.columns:
-                matches = df[df[col].str.lower().str.contains(keyword, na=False)]
-                if not matches.empty:
-                    total_matches = pd.concat([total_matches, matches])
-                    found = True
-        total_matches = total_matches.drop_duplicates()
-        count = len(total_matches)
-        if found and count > 0:
-            return f"📦 Total orders under '{keyword}' category: **{count}**"
-        else:
-            return f"❌ No orders found under the category '{keyword}'."
-
-    # How many orders did [supplier] make?
-    match = re.search(r"how many orders did ([\w\s&\-\.]+) (make|place|have|do)\??", question)
-    if match:
-        supplier_query = match.group(1).strip().lower()
-        matched = df[df['Supplier Name'].str.contains(supplier_query, na=False)]
-        return f"📦 {supplier_query.title()} made **{len(matched)}** orders."
-
-    # Total spend by [supplier]
-    match = re.search(r"total (spend|spending|expenditure|amount) by ([\w\s&\-\.]+)", question)
-    if match:
-        supplier_query = match.group(2).strip().lower()
-        matched = df[df['Supplier Name'].str.contains(supplier_query, na=False)]
-        total = matched['Total Price'].sum()
-        if not matched.empty:
-            actual_name = matched['Supplier Name'].mode()[0]
-            return f"💸 Total spend by {actual_name}: **${total:,.2f}**"
-        else:
-            return f"⚠️ No spending found for supplier '{supplier_query}'"
-
-    # --- Orders by Acquisition Method or Type ---
-    match = re.search(r"orders (?:using|used|with) ([\w\s\/\-]+)", question)
-    if match:
-        keyword = match.group(1).strip().lower()
-        keyword_cleaned = re.sub(r"(method|type|acquisition)", "", keyword).strip()
-        result_method = df[df['Acquisition Method'].str.lower().str.contains(keyword_cleaned, na=False)]
-        result_type = df[df['Acquisition Type'].str.lower().str.contains(keyword_cleaned, na=False)]
-        total = len(result_method) + len(result_type)
-        if total > 0:
-            return f"⚙️ Total orders using **{match.group(1).strip()}**: **{total}**"
-        else:
-            return f"⚠️ No orders found using '{match.group(1).strip()}'"
-
-    # ---------------- SPENDING & FINANCIALS ---------------- #
-    match = re.search(r"(?:total|overall) spending in (\d{4})", question)
-    if match:
-        year = int(match.group(1))
-        result = df[df['Year'] == year]
-        total = result['Total Price'].sum()
-        return f"💸 Total spending in {year}: **${total:,.2f}**"
-
-    match = re.search(r"average monthly spending(?: in| of)? ([\d,\sand]+)", question)
-    if match:
-        year_text = match.group(1)
-        years = [int(y) for y in re.findall(r'\d{4}', year_text)]
-        result = df[df['Year'].isin(years)]
-        if result.empty:
-            return f"⚠️ No records found for year(s): {', '.join(map(str, years))}"
-        response_lines = []
-        for y in years:
-            year_data = result[result['Year'] == y]
-            avg = year_data['Total Price'].sum() / 12
-            response_lines.append(f"📊 {y}: **${avg:,.2f}**")
-        return "📈 Average Monthly Spending:\n\n" + "\n".join(response_lines)
-
-    if "quarter with" in question and "highest" in question:
-        spending = df.groupby('Quarter')['Total Price'].sum()
-        max_q = spending.idxmax()
-        return f"💰 Quarter with highest spending: **Q{max_q} (${spending[max_q]:,.2f})**"
-
-    # Total spending on a supplier
-    match = re.search(r"total spending on ([\w\s&\-\.]+)", question)
-    if match:
-        supplier_query = match.group(1).strip().lower()
-        matched = df[df['Supplier Name'].str.contains(supplier_query, na=False)]
-        total = matched['Total Price'].sum()
-        if not matched.empty:
-            actual_name = matched['Supplier Name'].mode()[0]
+def _handle_most_common_class(df, slots):
+    if 'Class Title' in df.columns:
+        counts = _TOP['class_counts']
+        top_class, count = counts.index[0], counts.iloc[0]
+        return f"📚 Most common class: **{top_class}** ({count} orders)"
+
+def _handle_top_segments(df, slots):
+    if 'Segment Title' in df.columns:
+        segments = _TOP['segment_counts'].head(5)
+        return "📦 Top 5 segments:\n\n" + "\n".join(
+            [f"- {seg} ({count})" for seg, count in segments.items()]
+        )
+
+def _handle_location_most_orders(df, slots):
+    if 'Location' in df.columns:
+        counts = _TOP['location_counts']
+        top_location, count = counts.index[0], counts.iloc[0]
+        return f"📍 Location with most orders: **{top_location}** ({count} orders)"
+
+def _handle_items_bought_most(df, slots):
+    if 'Item Name' in df.columns:
+        items = _TOP['item_counts'].head(5)
+        return "🛒 Top 5 most frequently bought items:\n\n" + "\n".join(
+            [f"- {item} ({count})" for item, count in items.items()]
+        )
+    else:
+        return "⚠️ No 'Item Name' column in data."
+
+def _handle_spend_on_item(df, slots):
+    match = slots['match']
+    item_query = match.group(3).strip().lower()
+    item_query = _POSSESSIVE_RE.sub("", item_query)
+    item_query = _PLURAL_RE.sub("", item_query)
+    item_query = item_query.strip()
+    if 'Item Name' in df.columns:
+        mask = _contains_mask(df, 'Item Name', item_query)
+        total = _price_total(mask)
+        if mask.any():
+            actual_name = df.loc[mask, 'Item Name'].mode()[0]
             return f"💸 Total spending on {actual_name}: **${total:,.2f}**"
         else:
-            return f"⚠️ No spending found for supplier '{supplier_query}'"
-
-    # ---------------- SUPPLIER & ITEM ANALYTICS ---------------- #
-    if "most frequent" in question and "item" in question:
-        if 'Item Name' in df.columns:
-            items = df['Item Name'].value_counts().head(5)
-            return "🛒 Top 5 most frequently purchased items:\n\n" + "\n".join(
-                [f"- {item} ({count})" for item, count in items.items()]
-            )
+            return f"⚠️ No spending found for item '{item_query}'"
+    else:
+        return "⚠️ No 'Item Name' column in data."
+
+def _handle_segment_orders(df, slots):
+    match = slots['match']
+    segment_query = match.group(2).strip().lower()
+    if 'Segment Title' in df.columns:
+        matched = df[_contains_mask(df, 'Segment Title', segment_query)]
+        return f"📦 Orders in the '{segment_query}' segment: **{len(matched)}**"
+    else:
+        return "⚠️ No 'Segment Title' column in data."
+
+def _handle_most_expensive_supplier(df, slots):
+    # The trigger covers the spending phrases; "who was the most expensive
+    # supplier" style questions contain "supplier" as well.
+    if "supplier" not in slots['question']:
+        return None
+    if 'Supplier Name' in df.columns:
+        supplier_spending = _TOP['supplier_spending']
+        top_supplier = supplier_spending.idxmax()
+        amount = supplier_spending[top_supplier]
+        return f"💸 Most expensive supplier: **{top_supplier}** (${amount:,.2f})"
+    else:
+        return "⚠️ No 'Supplier Name' column in data."
+
+def _handle_supplier_orders_in_year(df, slots):
+    match = slots['match']
+    supplier_query = match.group(1).strip().lower()
+    year = int(match.group(2))
+    matched = df[(_contains_mask(df, 'Supplier Name', supplier_query)) & (df['Year'] == year)]
+    return f"📦 Orders from {supplier_query.title()} in {year}: **{len(matched)}**"
+
+def _handle_how_many_orders_from(df, slots):
+    match = slots['match']
+    supplier_query = match.group(2).strip().lower()
+    matched = df[_contains_mask(df, 'Supplier Name', supplier_query)]
+    return f"📦 Orders from {supplier_query.title()}: **{len(matched)}**"
+
+def _handle_top_items(df, slots):
+    match = slots['match']
+    n = match.group(2)
+    n = int(n) if n else 10
+    if 'Item Name' in df.columns:
+        items = _TOP['item_counts'].head(n)
+        return f"🛒 Top {n} most bought items:\n\n" + "\n".join(
+            [f"- {item} ({count})" for item, count in items.items()]
+        )
+    else:
+        return "⚠️ No 'Item Name' column in data."
+
+
+# ---- Dispatch Table ----
+# (required substrings, trigger pattern, intent) in priority order. The
+# substrings are the conditions the question must meet beyond the trigger
+# itself; the trigger regex only runs once each of them appears in the question.
+_INTENT_TRIGGERS = [
+    (frozenset(), _ZIP_PURCHASES_RE, "zip_purchases"),
+    (frozenset({"acquisition method"}), _PURCHASES_USED_RE, "acquisition_method_purchases"),
+    (frozenset({"top", "suppliers"}), _TOTAL_SPEND_RE, "top_suppliers"),
+    (frozenset({"supplier code"}), _TOTAL_PRICE_OR_SPEND_RE, "supplier_code_spend"),
+    (frozenset(), _HIGHEST_SPEND_TYPE_RE, "highest_spend_type"),
+    (frozenset({"fiscal year"}), _MOST_FREQUENT_ITEMS_RE, "frequent_items_fiscal_year"),
+    (frozenset(), _NORMALIZED_UNSPSC_RE, "normalized_unspsc"),
+    (frozenset(), _SUB_METHOD_TRANSACTIONS_RE, "sub_method_transactions"),
+    (frozenset(), _SEGMENT_FAMILY_RE, "item_classification"),
+    (frozenset({"how many items of", "bought in"}), _ITEM_CODE_YEAR_RE, "item_code_quantity"),
+    (frozenset(), _TOP_THREE_SUPPLIERS_RE, "top_three_suppliers"),
+    (frozenset({"fiscal year"}), _DEPARTMENT_SPEND_RE, "department_spend"),
+    (frozenset(), _LINKED_LOCATION_RE, "linked_location"),
+    (frozenset(), _SUPPLIER_CODE_TOTAL_RE, "supplier_code_total"),
+    (frozenset(), _ITEMS_BY_TYPE_RE, "items_by_acquisition_type"),
+    (frozenset(), _QUALIFIED_PURCHASES_RE, "qualified_supplier_purchases"),
+    (frozenset({"purchase order"}), _PO_QUANTITY_RE, "po_item_quantity"),
+    (frozenset(), _METHOD_COUNT_RE, "method_count"),
+    (frozenset(), _SEGMENT_FAMILY_DOES_RE, "segment_family_does"),
+    (frozenset(), _SUPPLIER_FY_SPEND_RE, "supplier_fiscal_year_spend"),
+    (frozenset({"calcard"}), _FISCAL_YEAR_RE, "calcard_fiscal_year"),
+    (frozenset(), _LPA_RE, "lpa_items"),
+    (frozenset(), _ACQ_METHODS_RE, "acquisition_methods_used"),
+    (frozenset(), _REQ_PO_RE, "requisition_po_number"),
+    (frozenset({"and"}), _SUPPLIER_YEARS_RE, "supplier_orders_by_years"),
+    (frozenset(), _QUANTITY_OF_RE, "item_quantity"),
+    (frozenset(), _QUANTITY_WERE_RE, "item_quantity"),
+    (frozenset(), _ITEMS_ORDERED_RE, "items_ordered_count"),
+    (frozenset(), _ITEM_COUNT_YEAR_RE, "item_purchase_count"),
+    (frozenset(), _SUPPLIER_ORDERS_YEAR_RE, "supplier_orders_year"),
+    (frozenset(), _ITEM_SPEND_YEAR_RE, "item_spend_year"),
+    (frozenset(), _CALCARD_YEAR_RE, "calcard_year"),
+    (frozenset(), _CALCARD_WHAT_RE, "calcard_year"),
+    (frozenset(), _ORDER_NUMBER_RE, "order_number"),
+    (frozenset(), _MOST_EXPENSIVE_RE, "most_expensive_item"),
+    (frozenset(), _DATE_RANGE_RE, "date_range"),
+    (frozenset(), _SUPPLIERS_ZIP_RE, "suppliers_by_zip"),
+    (frozenset(), _SUPPLIERS_QUAL_RE, "suppliers_by_qualification"),
+    (frozenset(), _COMMON_LOCATION_RE, "most_common_location"),
+    (frozenset(), _ITEM_TOTAL_YEAR_RE, "item_total_year"),
+    (frozenset(), _SPEND_ON_YEAR_RE, "item_total_year"),
+    (frozenset(), _LIST_SUPPLIERS_RE, "list_suppliers"),
+    (frozenset(), _TOTAL_ORDERS_RE, "total_orders"),
+    (frozenset(), _TOTAL_ORDERS_YEAR_RE, "total_orders_year"),
+    (frozenset(), _SPECIFIC_DATE_RE, "specific_date"),
+    (frozenset(), _MONTH_YEAR_RE, "month_year"),
+    (frozenset(), _ORDER_WORD_RE, "orders_by_years"),
+    (frozenset(), _ORDERS_YEAR_RE, "orders_year"),
+    (frozenset(), _QUARTER_YEAR_RE, "quarter_year"),
+    (frozenset(), _SUPPLIER_ZIP_ORDERS_RE, "supplier_zip_orders"),
+    (frozenset(), _DELIVERED_ZIP_RE, "delivered_zip"),
+    (frozenset(), _CLASSIFICATION_CODE_RE, "classification_code"),
+    (frozenset(), _CATEGORY_RE, "category"),
+    (frozenset(), _SUPPLIER_MADE_RE, "supplier_made_orders"),
+    (frozenset(), _SPEND_BY_RE, "spend_by_supplier"),
+    (frozenset(), _ORDERS_USING_RE, "orders_using"),
+    (frozenset(), _TOTAL_SPENDING_YEAR_RE, "total_spending_year"),
+    (frozenset(), _AVG_MONTHLY_RE, "average_monthly_spending"),
+    (frozenset({"highest"}), _QUARTER_WITH_RE, "highest_quarter"),
+    (frozenset(), _SPENDING_ON_RE, "spending_on_supplier"),
+    (frozenset(), _MOST_FREQUENT_RE, "most_frequent_items"),
+    (frozenset(), _ORDERS_RANKING_RE, "supplier_most_orders"),
+    (frozenset(), _SPENDING_BY_SUPPLIER_RE, "spending_by_supplier"),
+    (frozenset(), _COMMON_CLASS_RE, "most_common_class"),
+    (frozenset(), _TOP_SEGMENTS_RE, "top_segments"),
+    (frozenset(), _LOCATION_MOST_ORDERS_RE, "location_most_orders"),
+    (frozenset(), _ITEMS_MOST_RE, "items_bought_most"),
+    (frozenset(), _HOW_MUCH_SPEND_RE, "spend_on_item"),
+    (frozenset(), _SEGMENT_RE, "segment_orders"),
+    (frozenset(), _SUPPLIER_SPENDING_RANK_RE, "most_expensive_supplier"),
+    (frozenset(), _SUPPLIER_ORDERS_IN_YEAR_RE, "supplier_orders_in_year"),
+    (frozenset(), _HOW_MANY_ORDERS_FROM_RE, "how_many_orders_from"),
+    (frozenset(), _TOP_ITEMS_RE, "top_items"),
+]
+
+INTENT_HANDLERS = {
+    "zip_purchases": _handle_zip_purchases,
+    "acquisition_method_purchases": _handle_acquisition_method_purchases,
+    "top_suppliers": _handle_top_suppliers,
+    "supplier_code_spend": _handle_supplier_code_spend,
+    "highest_spend_type": _handle_highest_spend_type,
+    "frequent_items_fiscal_year": _handle_frequent_items_fiscal_year,
+    "normalized_unspsc": _handle_normalized_unspsc,
+    "sub_method_transactions": _handle_sub_method_transactions,
+    "item_classification": _handle_item_classification,
+    "item_code_quantity": _handle_item_code_quantity,
+    "top_three_suppliers": _handle_top_three_suppliers,
+    "department_spend": _handle_department_spend,
+    "linked_location": _handle_linked_location,
+    "supplier_code_total": _handle_supplier_code_total,
+    "items_by_acquisition_type": _handle_items_by_acquisition_type,
+    "qualified_supplier_purchases": _handle_qualified_supplier_purchases,
+    "po_item_quantity": _handle_po_item_quantity,
+    "method_count": _handle_method_count,
+    "segment_family_does": _handle_segment_family_does,
+    "supplier_fiscal_year_spend": _handle_supplier_fiscal_year_spend,
+    "calcard_fiscal_year": _handle_calcard_fiscal_year,
+    "lpa_items": _handle_lpa_items,
+    "acquisition_methods_used": _handle_acquisition_methods_used,
+    "requisition_po_number": _handle_requisition_po_number,
+    "supplier_orders_by_years": _handle_supplier_orders_by_years,
+    "item_quantity": _handle_item_quantity,
+    "items_ordered_count": _handle_items_ordered_count,
+    "item_purchase_count": _handle_item_purchase_count,
+    "supplier_orders_year": _handle_supplier_orders_year,
+    "item_spend_year": _handle_item_spend_year,
+    "calcard_year": _handle_calcard_year,
+    "order_number": _handle_order_number,
+    "most_expensive_item": _handle_most_expensive_item,
+    "date_range": _handle_date_range,
+    "suppliers_by_zip": _handle_suppliers_by_zip,
+    "suppliers_by_qualification": _handle_suppliers_by_qualification,
+    "most_common_location": _handle_most_common_location,
+    "item_total_year": _handle_item_total_year,
+    "list_suppliers": _handle_list_suppliers,
+    "total_orders": _handle_total_orders,
+    "total_orders_year": _handle_total_orders_year,
+    "specific_date": _handle_specific_date,
+    "month_year": _handle_month_year,
+    "orders_by_years": _handle_orders_by_years,
+    "orders_year": _handle_orders_year,
+    "quarter_year": _handle_quarter_year,
+    "supplier_zip_orders": _handle_supplier_zip_orders,
+    "delivered_zip": _handle_delivered_zip,
+    "classification_code": _handle_classification_code,
+    "category": _handle_category,
+    "supplier_made_orders": _handle_supplier_made_orders,
+    "spend_by_supplier": _handle_spend_by_supplier,
+    "orders_using": _handle_orders_using,
+    "total_spending_year": _handle_total_spending_year,
+    "average_monthly_spending": _handle_average_monthly_spending,
+    "highest_quarter": _handle_highest_quarter,
+    "spending_on_supplier": _handle_spending_on_supplier,
+    "most_frequent_items": _handle_most_frequent_items,
+    "supplier_most_orders": _handle_supplier_most_orders,
+    "spending_by_supplier": _handle_spending_by_supplier,
+    "most_common_class": _handle_most_common_class,
+    "top_segments": _handle_top_segments,
+    "location_most_orders": _handle_location_most_orders,
+    "items_bought_most": _handle_items_bought_most,
+    "spend_on_item": _handle_spend_on_item,
+    "segment_orders": _handle_segment_orders,
+    "most_expensive_supplier": _handle_most_expensive_supplier,
+    "supplier_orders_in_year": _handle_supplier_orders_in_year,
+    "how_many_orders_from": _handle_how_many_orders_from,
+    "top_items": _handle_top_items,
+}
+
+# Triggers that are plain phrase alternations ("total price|total spend") are
+# also prefiltered by phrase: one Aho-Corasick pass over the question finds
+# every such phrase at once, and handlers none of whose phrases occurred are
+# skipped without running their regex.
+_LITERAL_TRIGGER_RE = re.compile(r"[a-z0-9 \-]+(?:\|[a-z0-9 \-]+)*")
+
+def _trigger_phrases(pattern):
+    if _LITERAL_TRIGGER_RE.fullmatch(pattern.pattern):
+        return frozenset(pattern.pattern.split("|"))
+    return None
+
+_DISPATCH = [(required, _trigger_phrases(pattern), pattern, intent)
+             for required, pattern, intent in _INTENT_TRIGGERS]
+_PHRASES = frozenset().union(*(phrases for _, phrases, _, _ in _DISPATCH if phrases))
+
+# Optional columns an intent reads without checking for them first. Intents
+# whose columns the loaded data lacks answer with a missing-column notice
+# instead of running their handler.
+INTENT_COLUMNS = {
+    "zip_purchases": {'Location', 'Supplier Zip Code'},
+    "suppliers_by_zip": {'Supplier Zip Code'},
+    "frequent_items_fiscal_year": {'Fiscal Year'},
+    "supplier_fiscal_year_spend": {'Fiscal Year'},
+    "calcard_fiscal_year": {'CalCard', 'Fiscal Year'},
+    "calcard_year": {'CalCard'},
+    "qualified_supplier_purchases": {'Supplier Qualifications'},
+    "suppliers_by_qualification": {'Supplier Qualifications'},
+    "linked_location": {'Location'},
+    "sub_method_transactions": {'Sub-Acquisition Method'},
+    "department_spend": {'Department Name', 'Fiscal Year'},
+    "items_by_acquisition_type": {'Item Description'},
+    "normalized_unspsc": {'Normalized UNSPSC'},
+    "item_code_quantity": {'Classification Codes', 'Normalized UNSPSC', 'Quantity'},
+    "order_number": {'Requisition Number', 'Purchase Order Number'},
+    "requisition_po_number": {'Requisition Number', 'Purchase Order Number'},
+    "supplier_code_spend": {'Supplier Code'},
+    "supplier_code_total": {'Supplier Code'},
+    "po_item_quantity": {'Purchase Order Number', 'Quantity'},
+    "lpa_items": {'LPA Number'},
+    "item_quantity": {'Item Name', 'Quantity'},
+    "item_purchase_count": {'Item Name'},
+}
+
+def _combined_trigger_re(dispatch):
+    """All triggers as one regex, alternatives in priority order.
+
+    Each alternative is anchored at the start and lazily skips ahead, so the
+    match comes from the first trigger that occurs anywhere in the question
+    and lastgroup ("t<index>") says which one it was.
+    """
+    alternatives = []
+    for i, (_, _, pattern, _) in enumerate(dispatch):
+        body = pattern.pattern
+        if pattern.flags & re.IGNORECASE:
+            body = f"(?i:{body})"
+        alternatives.append(rf"[\s\S]*?(?P<t{i}>{body})")
+    return re.compile("|".join(alternatives))
+
+_TRIGGER_RE = _combined_trigger_re(_DISPATCH)
+
+# intent -> the INTENT_COLUMNS it needs that the loaded data lacks
+_missing_columns = {}
+
+def _select_intents(columns):
+    global _missing_columns
+    columns = set(columns)
+    _missing_columns = {intent: needed - columns for intent, needed in INTENT_COLUMNS.items()
+                        if not needed <= columns}
+
+if ahocorasick is not None:
+    _PHRASE_AUTOMATON = ahocorasick.Automaton()
+    for phrase in _PHRASES:
+        _PHRASE_AUTOMATON.add_word(phrase, phrase)
+    _PHRASE_AUTOMATON.make_automaton()
+
+def _phrases_in(question):
+    """Every literal trigger phrase that occurs in question"""
+    if ahocorasick is None:
+        return {phrase for phrase in _PHRASES if phrase in question}
+    return {phrase for _, phrase in _PHRASE_AUTOMATON.iter(question)}
+
+def _first_int(pattern, question):
+    found = pattern.search(question)
+    return int(found.group(1)) if found else None
+
+def _parse(question):
+    """Extract the slots shared across intents from the question, once"""
+    question = question.lower()
+    zip_match = _ZIP_RE.search(question)
+    fiscal_match = _FISCAL_YEAR_RE.search(question)
+    return {
+        'question': question,
+        'phrases': _phrases_in(question),
+        'year': _first_int(_IN_YEAR_RE, question),        # "in 2014"
+        'any_year': _first_int(_ANY_YEAR_RE, question),   # first four-digit run
+        'years': [int(y) for y in _YEARS_RE.findall(question)],
+        'fiscal_year': fiscal_match.group(1) if fiscal_match else None,
+        'top_n': _first_int(_TOP_N_RE, question),
+        'zip': zip_match.group(1) if zip_match else None,
+    }
 
-    if (
-        ("supplier" in question and (
-            "most orders" in question or
-            "highest number of orders" in question or
-            "largest number of orders" in question or
-            "greatest number of orders" in question or
-            "maximum number of orders" in question or
-            "biggest number of orders" in question or
-            "top number of orders" in question
-        ))
-        or re.search(r"name of (the )?supplier with (the )?(most|highest|largest|greatest|max(imum)?|biggest|top) number of orders", question)
-        or re.search(r"which supplier had (the )?(most|highest|largest|greatest|max(imum)?|biggest|top) number of orders", question)
-        or re.search(r"who (is|was) (the )?supplier with (the )?(most|highest|largest|greatest|max(imum)?|biggest|top) number of orders", question)
-        or re.search(r"supplier with (the )?(most|highest|largest|greatest|max(imum)?|biggest|top) number of orders", question)
-    ):
-        if 'Supplier Name' in df.columns:
-            top_supplier = df['Supplier Name'].value_counts().idxmax()
-            count = df['Supplier Name'].value_counts().max()
-            return f"🏢 Supplier with most orders: **{top_supplier}** ({count} orders)"
-        else:
-            return "⚠️ No 'Supplier Name' column in data."
+def _classify(slots):
+    """Yield (intent, trigger match) for every intent the question matches, in priority order"""
+    question = slots['question']
+    first = _TRIGGER_RE.match(question)
+    if first is None:
+        return
+    # Triggers ahead of the first hit cannot match; walk the rest in order
+    for required, phrases, pattern, intent in _DISPATCH[int(first.lastgroup[1:]):]:
+        if not all(text in question for text in required):
+            continue
+        if phrases is not None and slots['phrases'].isdisjoint(phrases):
+            continue
+        match = pattern.search(question)
+        if match:
+            yield intent, match
 
-    if "spending by supplier" in question:
-        supplier_spending = df.groupby('Supplier Name')['Total Price'].sum().sort_values(ascending=False).head(5)
-        return "🏢 Top 5 suppliers by total spending:\n\n" + "\n".join(
-            [f"- {supplier}: ${amount:,.2f}" for supplier, amount in supplier_spending.items()]
-        )
 
-    # ---------------- CLASSIFICATIONS & CATEGORIES ---------------- #
-    if "most common class" in question:
-        if 'Class Title' in df.columns:
-            top_class = df['Class Title'].value_counts().idxmax()
-            count = df['Class Title'].value_counts().max()
-            return f"📚 Most common class: **{top_class}** ({count} orders)"
-
-    if "top categories" in question or "top segments" in question:
-        if 'Segment Title' in df.columns:
-            segments = df['Segment Title'].value_counts().head(5)
-            return "📦 Top 5 segments:\n\n" + "\n".join(
-                [f"- {seg} ({count})" for seg, count in segments.items()]
-            )
+def handle_question(question):
+    df = load_procurement_data()
+    if df.empty:
+        return "⚠️ Could not load data. Please check database connection."
+
+    slots = _parse(question)
+    for intent, match in _classify(slots):
+        if intent in _missing_columns:
+            return f"⚠️ No {', '.join(sorted(_missing_columns[intent]))} column found in data."
+        slots['match'] = match
+        answer = INTENT_HANDLERS[intent](df, slots)
+        if answer is not None:
+            return answer
 
-    # ---------------- LOCATION-BASED ---------------- #
-    if "location with most orders" in question:
-        if 'Location' in df.columns:
-            top_location = df['Location'].value_counts().idxmax()
-            count = df['Location'].value_counts().max()
-            return f"📍 Location with most orders: **{top_location}** ({count} orders)"
-
-    if re.search(r"(what|which) (items|item) (were|was)? ?(bought|purchased|ordered)? ?(the )?most", question):
-        if 'Item Name' in df.columns:
-            items = df['Item Name'].value_counts().head(5)
-            return "🛒 Top 5 most frequently bought items:\n\n" + "\n".join(
-                [f"- {item} ({count})" for item, count in items.items()]
-            )
-        else:
-            return "⚠️ No 'Item Name' column in data."
-
-    match = re.search(r"how much (did we|was)? ?(spend|spent) on ([\w\s&\-\.]+)", question)
-    if match:
-        item_query = match.group(3).strip().lower()
-        item_query = re.sub(r"'s$", "", item_query)
-        item_query = re.sub(r"s$", "", item_query)
-        item_query = item_query.strip()
-        if 'Item Name' in df.columns:
-            matched = df[df['Item Name'].str.lower().str.contains(item_query, na=False)]
-            total = matched['Total Price'].sum()
-            if not matched.empty:
-                actual_name = matched['Item Name'].mode()[0]
-                return f"💸 Total spending on {actual_name}: **${total:,.2f}**"
-            else:
-                return f"⚠️ No spending found for item '{item_query}'"
-        else:
-            return "⚠️ No 'Item Name' column in data."
-
-    match = re.search(r"orders in (the )?([\w\s&\-\.]+) segment", question)
-    if match:
-        segment_query = match.group(2).strip().lower()
-        if 'Segment Title' in df.columns:
-            matched = df[df['Segment Title'].str.lower().str.contains(segment_query, na=False)]
-            return f"📦 Orders in the '{segment_query}' segment: **{len(matched)}**"
-        else:
-            return "⚠️ No 'Segment Title' column in data."
-
-    if (
-        ("supplier" in question and ("most expensive" in question or "highest spending" in question or "most spending" in question or "greatest spending" in question or "largest spending" in question))
-        or re.search(r"who (was|is) (the )?(most expensive|highest spending|most spending|greatest spending|largest spending) supplier", question)
-    ):
-        if 'Supplier Name' in df.columns:
-            supplier_spending = df.groupby('Supplier Name')['Total Price'].sum()
-            top_supplier = supplier_spending.idxmax()
-            amount = supplier_spending.max()
-            return f"💸 Most expensive supplier: **{top_supplier}** (${amount:,.2f})"
-        else:
-            return "⚠️ No 'Supplier Name' column in data."
-
-    match = re.search(r"orders? (?:from|by|with|placed with|made by) ([\w\s&\-\.]+) in (\d{4})", question)
-    if match:
-        supplier_query = match.group(1).strip().lower()
-        year = int(match.group(2))
-        matched = df[(df['Supplier Name'].str.contains(supplier_query, na=False)) & (df['Year'] == year)]
-        return f"📦 Orders from {supplier_query.title()} in {year}: **{len(matched)}**"
-
-    match = re.search(r"how many orders (from|by|with|placed with|made by) ([\w\s&\-\.]+)\??", question)
-    if match:
-        supplier_query = match.group(2).strip().lower()
-        matched = df[df['Supplier Name'].str.contains(supplier_query, na=False)]
-        return f"📦 Orders from {supplier_query.title()}: **{len(matched)}**"
-
-    match = re.search(r"(top|show|list|give me|tell me|what are|which are)? ?(\d+)? ?(most|top)? ?(bought|purchased|ordered)? ?items", question)
-    if match:
-        n = match.group(2)
-        n = int(n) if n else 10
-        if 'Item Name' in df.columns:
-            items = df['Item Name'].value_counts().head(n)
-            return f"🛒 Top {n} most bought items:\n\n" + "\n".join(
-                [f"- {item} ({count})" for item, count in items.items()]
-            )
-        else:
-            return "⚠️ No 'Item Name' column in data."
-    
     # ---------------- FALLBACK ---------------- #
     suggestions = [
         "Try asking about orders in a specific year or quarter",
@@ -988,21 +1776,30 @@ def handle_question(question):
         "Ask 'Which supplier had the most orders?'",
         "Try 'What was the total spending in 2014?'"
     ]
-    
+
     return "❌ I didn't understand your question. Try one of these:\n\n- " + "\n- ".join(suggestions[:3])
 
+
+# Answers only depend on the data, which is loaded once per process, so
+# repeated questions (retries, the example prompts) are served from here
+@lru_cache(maxsize=1024)
+def _answer(canonical_question):
+    return handle_question(canonical_question)
+
 # Debugging Chat Interface 
 def chatbot_response(message, history):
-    debug_print(f"User asked: {message}")
+    logger.debug("User asked: %s", message)
     try:
-        return handle_question(message)
+        # Handlers see the question lowercased anyway; collapsing whitespace too
+        # lets "Total  orders in 2014 " share a cache entry with its tidy form
+        return _answer(" ".join(message.lower().split()))
     except Exception as e:
-        debug_print(f"Response error: {e}")
+        logger.error("Response error: %s", e)
         return f"❌ Error: {str(e)}"
 
 # ---- Launch App ----
 if __name__ == "__main__":
-    debug_print("Starting enhanced Gradio interface")
+    logger.info("Starting enhanced Gradio interface")
 
     colorful_theme = gr.themes.Base(
         primary_hue="purple",
@@ -1053,7 +1850,9 @@ if __name__ == "__main__":
         ],
         theme=colorful_theme,
         type="messages",
-        css=gradient_css
+        css=gradient_css,
+        # Handlers only read the loaded data, so a few users can be answered at once
+        concurrency_limit=4
     )
 
     demo.launch(
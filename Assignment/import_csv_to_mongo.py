@@ -1,16 +1,22 @@
+import os
+
 import pandas as pd
 from pymongo import MongoClient
 
 # Path to your CSV file
 csv_file = 'PURCHASE ORDER DATA EXTRACT 2012-2015_0.csv'
 
+# The chatbot's processed Parquet cache (see CACHE_PATH in demo5.py)
+cache_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'procurement_cache.parquet')
+
 # Read the CSV file
 print(f"Reading CSV file: {csv_file}")
 df = pd.read_csv(csv_file)
 print(f"Loaded {len(df)} rows from CSV.")
 
-# Connect to MongoDB
-client = MongoClient('mongodb://localhost:27017/')
+# Connect to MongoDB; zstd compresses the wire payload (pymongo falls back to zlib
+# with a warning if the zstandard package is not installed)
+client = MongoClient('mongodb://localhost:27017/', compressors='zstd,zlib')
 db = client['orderData']
 collection = db['sample']
 
@@ -18,8 +24,21 @@ collection = db['sample']
 print("Deleting existing documents in 'sample' collection...")
 collection.delete_many({})
 
-# Insert new data
+# Insert new data in fixed-size batches, building each batch's documents column-wise
+# so the whole frame is never materialised as one list of per-row dicts
+BATCH_SIZE = 20000
 print("Inserting new documents...")
-collection.insert_many(df.to_dict('records'))
+columns = df.columns.tolist()
+values = [df[col].tolist() for col in columns]
+for start in range(0, len(df), BATCH_SIZE):
+    rows = zip(*(vals[start:start + BATCH_SIZE] for vals in values))
+    collection.insert_many([dict(zip(columns, row)) for row in rows], ordered=False)
 print(f"Inserted {collection.count_documents({})} documents into 'sample' collection.")
 
+# A cache still inside its max age is served without touching Mongo, so the
+# chatbot would keep answering from the pre-import data; drop the cache so it
+# rebuilds from the new collection on its next start
+for path in (cache_file, cache_file + '.hwm'):
+    if os.path.exists(path):
+        os.remove(path)
+        print(f"Removed stale chatbot cache {os.path.basename(path)}")